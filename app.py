@@ -1,26 +1,88 @@
 
-from flask import Flask, Response, url_for
+from flask import Flask, Response, url_for, jsonify, g, request, request_started
+import hmac
+import time
 import os
 import urllib.parse
 from werkzeug.middleware.proxy_fix import ProxyFix
 from valorant.index import valorant_index
 from valorant.endpoints import rango, ultima_ranked
-from twitch.endpoints import followage, token, status, oauth_callback, clip
+from twitch.endpoints import followage, followage_batch, token, status, oauth_callback, clip, clip_result
 from twitch.index import twitch_index
 from common.response import text_response
+from common.pages import memoized_page
+from common.assets import init_assets
+from common.health import checker
+from common.breaker import breaker_states
+from common.deadline import with_deadline
+from common import governor, metrics
+from common.profiling import init_profiling, debug_slow
 import logging
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import requests
-from common.http import get_session
+import common.ratelimit  # registra el storage sqlite:// del limiter
 
 app = Flask(__name__, static_folder='img', static_url_path='/img')
 app.config['PREFERRED_URL_SCHEME'] = 'https'
+# Permite desactivar el rate limiting (p. ej. para benchmarks locales).
+app.config['RATELIMIT_ENABLED'] = (os.environ.get("RATELIMIT_ENABLED", "1").strip().lower() not in ("0", "false", "no"))
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1)
+# URLs con huella para img/ (ver `python -m common.assets`)
+init_assets(app)
 logging.basicConfig(level=logging.INFO)
 
-limiter = Limiter(get_remote_address, app=app, default_limits=["100 per minute"], storage_uri=os.environ.get("RATELIMIT_STORAGE_URI", "memory://")) 
-_session = get_session()
+# Con varios workers, memory:// cuenta por proceso; sqlite:// comparte los contadores en la máquina.
+_default_storage = "sqlite://" if int(os.environ.get("WEB_CONCURRENCY", "1")) > 1 else "memory://"
+def _route_label() -> str:
+    return request.url_rule.rule if request.url_rule is not None else "<sin ruta>"
+
+
+def _on_limit_breach(limit):
+    metrics.RATELIMIT_REJECTIONS.inc(_route_label(), str(limit.limit))
+
+
+limiter = Limiter(
+    get_remote_address,
+    app=app,
+    default_limits=["100 per minute"],
+    storage_uri=os.environ.get("RATELIMIT_STORAGE_URI", _default_storage),
+    strategy=os.environ.get("RATELIMIT_STRATEGY", "sliding-window-counter"),
+    on_breach=_on_limit_breach,
+)
+# Perfilado opcional (PROFILE_SAMPLE_RATE / PROFILE_TOKEN); va después del limiter para medir su costo.
+init_profiling(app)
+
+
+# Latencia por ruta: request_started llega antes que los before_request (incluido el limiter).
+def _start_timer(sender, **extra):
+    g.started_at = time.perf_counter()
+
+
+request_started.connect(_start_timer, app)
+
+
+@app.after_request
+def _record_request(resp: Response):
+    started = g.get('started_at')
+    route = _route_label()
+    metrics.REQUESTS.inc(route, request.method, str(resp.status_code))
+    if started is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route)
+    return resp
+
+
+# Las llamadas a upstreams hechas al atender una petición tienen prioridad sobre
+# las de hilos de fondo (ver common/governor.py).
+@app.before_request
+def _upstream_priority():
+    g.upstream_priority = governor.set_priority("high")
+
+
+@app.teardown_request
+def _reset_upstream_priority(exc=None):
+    token = g.pop('upstream_priority', None)
+    if token is not None:
+        governor.reset_priority(token)
 
 # Cabeceras de seguridad para las respuestas
 @app.after_request
@@ -35,6 +97,7 @@ def add_security_headers(resp: Response):
     return resp
 
 @app.route('/')
+@memoized_page
 def index():
     v_index = url_for('valorant_index')
     t_index = url_for('twitch_index')
@@ -75,14 +138,14 @@ def index():
   <body>
     <div class=\"card\">
       <div class=\"title\">
-        <img src=\"{url_for('static', filename='user/naye_icon.webp')}\" alt=\"Naye\" loading=\"lazy\" />
+        <img src=\"{url_for('static', filename='user/naye_icon.webp', size=32)}\" srcset=\"{url_for('static', filename='user/naye_icon.webp', size=64)} 2x\" alt=\"Naye\" loading=\"lazy\" />
         <h1>API de Nayecute</h1>
       </div>
       <p>Selecciona una sección para ver sus endpoints y ejemplos.</p>
       <div class=\"grid\">
         <div class=\"item\">
           <div class=\"title\">
-            <img src=\"{url_for('static', filename='valorant/valorant_Icon_purple.webp')}\" alt=\"Valorant\" loading=\"lazy\" />
+            <img src=\"{url_for('static', filename='valorant/valorant_Icon_purple.webp', size=32)}\" srcset=\"{url_for('static', filename='valorant/valorant_Icon_purple.webp', size=64)} 2x\" alt=\"Valorant\" loading=\"lazy\" />
             <a href=\"{v_index}\">Valorant</a>
           </div>
           <ul>
@@ -96,7 +159,7 @@ def index():
 
         <div class=\"item\"> 
           <div class=\"title\">
-            <img src=\"{url_for('static', filename='twitch/twitch.webp')}\" alt=\"Twitch\" loading=\"lazy\" />
+            <img src=\"{url_for('static', filename='twitch/twitch.webp', size=32)}\" srcset=\"{url_for('static', filename='twitch/twitch.webp', size=64)} 2x\" alt=\"Twitch\" loading=\"lazy\" />
             <a href=\"{t_index}\">Twitch</a>
           </div>
           <ul>
@@ -117,18 +180,65 @@ def index():
     return Response(html, mimetype="text/html")
 
 
-# Valorant
-app.add_url_rule('/valorant', view_func=valorant_index)
-app.add_url_rule('/valorant/rango', view_func=limiter.limit("30 per minute")(rango))
-app.add_url_rule('/valorant/ultima-ranked', view_func=limiter.limit("30 per minute")(ultima_ranked))
+# Salud: /healthz lee el último estado de las dependencias (sondeadas en segundo plano),
+# /livez sólo confirma que el proceso responde.
+@app.route('/healthz')
+@limiter.exempt
+def healthz():
+    overall, deps = checker.snapshot()
+    resp = jsonify({
+        'status': overall,
+        'checks': deps,
+        'breakers': breaker_states(),
+        'rate_limits': governor.governor_states(),
+    })
+    resp.status_code = 200 if overall in ('ok', 'starting') else 502
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
+@app.route('/livez')
+@limiter.exempt
+def livez():
+    resp = text_response("ok")
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
+# Métricas en formato Prometheus; con METRICS_TOKEN definido exige `Authorization: Bearer <token>`.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+
+@app.route('/metrics')
+@limiter.exempt
+def metrics_endpoint():
+    if METRICS_TOKEN:
+        given = (request.headers.get("Authorization") or "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(given.encode(), METRICS_TOKEN.encode()):
+            return text_response("No autorizado.", 401)
+    resp = Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
+# Peticiones lentas y perfiles de CPU (exige `X-Profile-Token`; 404 sin PROFILE_TOKEN).
+app.add_url_rule('/debug/slow', view_func=limiter.exempt(debug_slow))
+
+
+# Valorant (las rutas de bots llevan deadline, ver common/deadline.py)
+app.add_url_rule('/valorant', view_func=memoized_page(valorant_index))
+app.add_url_rule('/valorant/rango', view_func=limiter.limit("30 per minute")(with_deadline(rango)))
+app.add_url_rule('/valorant/ultima-ranked', view_func=limiter.limit("30 per minute")(with_deadline(ultima_ranked)))
 
 # twitch
-app.add_url_rule('/twitch', view_func=twitch_index)
-app.add_url_rule('/twitch/followage', view_func=limiter.limit("60 per minute")(followage))
+app.add_url_rule('/twitch', view_func=memoized_page(twitch_index))
+app.add_url_rule('/twitch/followage', view_func=limiter.limit("60 per minute")(with_deadline(followage)))
+app.add_url_rule('/twitch/followage/batch', view_func=limiter.limit("10 per minute")(with_deadline(followage_batch)), methods=['GET', 'POST'])
 app.add_url_rule('/twitch/token', view_func=limiter.limit("10 per minute")(token))
-app.add_url_rule('/twitch/status', view_func=limiter.limit("30 per minute")(status))
+app.add_url_rule('/twitch/status', view_func=limiter.limit("30 per minute")(governor.with_low_priority(status)))
 app.add_url_rule('/oauth/callback', view_func=oauth_callback, methods=['GET','POST'])
 app.add_url_rule('/twitch/clip', view_func=limiter.limit("10 per minute")(clip), methods=['GET', 'POST'])
+app.add_url_rule('/twitch/clip/<job_id>', view_func=limiter.limit("60 per minute")(clip_result))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+"""
+Benchmark de memoria de la caché con 100k claves.
+
+Compara el formato antiguo (un dict por entrada, sin límites) con
+`common.cache.SimpleTTLCache` (entradas con __slots__ + LRU).
+
+Uso:
+    python -m bench.cache_memory [n_claves]
+"""
+import sys
+import time
+import tracemalloc
+
+from common.cache import SimpleTTLCache
+
+
+class _LegacyCache:
+    """Reproducción del SimpleTTLCache original para comparar."""
+
+    def __init__(self, default_ttl: int = 15):
+        self._store = {}
+        self.default_ttl = default_ttl
+
+    def set(self, key, value, ttl=None):
+        self._store[key] = {
+            'val': value,
+            'ts': time.time(),
+            'ttl': ttl if ttl is not None else self.default_ttl,
+        }
+
+
+def _measure(factory, n: int) -> tuple[int, float, object]:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    cache = factory()
+    for i in range(n):
+        cache.set(f"followage:user{i}:canal", f"user{i} sigue a canal desde hace {i % 365} días.")
+    elapsed = time.perf_counter() - t0
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, elapsed, cache
+
+
+def main(n: int = 100_000) -> None:
+    legacy_mem, legacy_t, _ = _measure(_LegacyCache, n)
+    new_mem, new_t, unbounded = _measure(
+        lambda: SimpleTTLCache(default_ttl=15, max_entries=n, max_bytes=1 << 40), n
+    )
+    bounded_mem, bounded_t, bounded = _measure(lambda: SimpleTTLCache(default_ttl=15), n)
+
+    print(f"claves insertadas: {n}")
+    print(f"legacy (dict por entrada):   {legacy_mem / 1e6:8.2f} MB  {legacy_t * 1e3:8.1f} ms")
+    print(f"SimpleTTLCache sin límite:   {new_mem / 1e6:8.2f} MB  {new_t * 1e3:8.1f} ms  entradas={len(unbounded)}")
+    print(f"SimpleTTLCache por defecto:  {bounded_mem / 1e6:8.2f} MB  {bounded_t * 1e3:8.1f} ms  {bounded.stats()}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
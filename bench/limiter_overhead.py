@@ -0,0 +1,80 @@
+"""
+Benchmark: costo por petición del rate limiter según el storage.
+
+Mide `SlidingWindowCounterRateLimiter.hit()` (lo que hace Flask-Limiter en cada
+petición) con `memory://` y con `sqlite://` (common.ratelimit), con 1 y N hilos,
+y comprueba que el límite se respeta entre procesos con sqlite://.
+
+Uso:
+    python -m bench.limiter_overhead [hits] [hilos]
+    python -m bench.limiter_overhead 20000 8
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+import multiprocessing
+from limits import parse, storage, strategies
+import common.ratelimit  # noqa: F401  registra sqlite://
+
+LIMIT = parse("1000000 per minute")
+
+
+def _hits(limiter, n: int, key: str) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        limiter.hit(LIMIT, key, str(i % 64))
+    return time.perf_counter() - t0
+
+
+def _measure(name: str, uri: str, hits: int, threads: int) -> None:
+    limiter = strategies.SlidingWindowCounterRateLimiter(storage.storage_from_string(uri))
+    _hits(limiter, 200, "warmup")
+    one = _hits(limiter, hits, "single")
+    per = hits // threads
+    ts = [threading.Thread(target=_hits, args=(limiter, per, f"t{i}")) for i in range(threads)]
+    t0 = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    many = time.perf_counter() - t0
+    print(
+        f"{name:<8} 1 hilo: {one / hits * 1e6:7.1f} µs/hit   "
+        f"{threads} hilos: {per * threads / many:9.0f} hits/s"
+    )
+
+
+def _worker(uri: str, n: int, out) -> None:
+    limiter = strategies.SlidingWindowCounterRateLimiter(storage.storage_from_string(uri))
+    ok = sum(1 for _ in range(n) if limiter.hit(parse("100 per minute"), "shared"))
+    out.put(ok)
+
+
+def _cross_process(uri: str, procs: int = 4, each: int = 60) -> None:
+    ctx = multiprocessing.get_context("fork")
+    out = ctx.Queue()
+    ps = [ctx.Process(target=_worker, args=(uri, each, out)) for _ in range(procs)]
+    for p in ps:
+        p.start()
+    for p in ps:
+        p.join()
+    allowed = sum(out.get() for _ in ps)
+    print(f"{procs} procesos x {each} hits contra '100 per minute' -> permitidos: {allowed} (esperado 100)")
+
+
+def main(hits: int = 20_000, threads: int = 8) -> None:
+    path = os.path.join(tempfile.mkdtemp(prefix="naye_bench_"), "ratelimit.sqlite3")
+    print(f"hits={hits} hilos={threads}")
+    _measure("memory", "memory://", hits, threads)
+    _measure("sqlite", f"sqlite://{path}", hits, threads)
+    _cross_process(f"sqlite://{path}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        int(args[0]) if len(args) > 0 else 20_000,
+        int(args[1]) if len(args) > 1 else 8,
+    )
@@ -0,0 +1,105 @@
+"""
+Benchmark: servidor de desarrollo (`python app.py`) vs gunicorn (`wsgi:app`).
+
+Levanta cada modo en un puerto local, lanza N clientes concurrentes contra una
+ruta durante unos segundos y muestra peticiones/s y latencias p50/p99.
+El rate limiting se desactiva (RATELIMIT_ENABLED=0) para medir sólo el servidor.
+
+Uso:
+    python -m bench.serving [ruta] [clientes] [segundos]
+    python -m bench.serving / 32 10
+"""
+import os
+import sys
+import time
+import socket
+import signal
+import threading
+import subprocess
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port: int, timeout: float = 20.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"El servidor no arrancó en el puerto {port}")
+
+
+def _load(port: int, path: str, clients: int, seconds: float) -> tuple[int, int, list[float]]:
+    latencies: list[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        local: list[float] = []
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                r = conn.getresponse()
+                r.read()
+                if r.status >= 500:
+                    errors[0] += 1
+                local.append(time.perf_counter() - t0)
+            except Exception:
+                errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        with lock:
+            latencies.extend(local)
+
+    ts = [threading.Thread(target=worker) for _ in range(clients)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return len(latencies), errors[0], sorted(latencies)
+
+
+def _run(name: str, cmd: list[str], path: str, clients: int, seconds: float) -> None:
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port), RATELIMIT_ENABLED="0", GUNICORN_ACCESS_LOG="")
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port)
+        _load(port, path, 2, 1.0)  # calentamiento
+        n, errors, lat = _load(port, path, clients, seconds)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+    if not lat:
+        print(f"{name:<10} sin respuestas (errores={errors})")
+        return
+    p50 = lat[len(lat) // 2] * 1e3
+    p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1e3
+    print(f"{name:<10} {n / seconds:9.1f} req/s  p50={p50:7.2f} ms  p99={p99:7.2f} ms  errores={errors}")
+
+
+def main(path: str = "/", clients: int = 32, seconds: float = 10.0) -> None:
+    print(f"ruta={path} clientes={clients} duración={seconds}s")
+    _run("werkzeug", [sys.executable, "app.py"], path, clients, seconds)
+    _run("gunicorn", [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"], path, clients, seconds)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        args[0] if len(args) > 0 else "/",
+        int(args[1]) if len(args) > 1 else 32,
+        float(args[2]) if len(args) > 2 else 10.0,
+    )
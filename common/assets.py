@@ -0,0 +1,132 @@
+"""
+Assets de `img/` con huella de contenido (fingerprint) y caché inmutable.
+
+Paso de build (Render lo corre tras instalar dependencias):
+
+    python -m common.assets
+
+Copia cada archivo de `img/` a `img/dist/<ruta>.<hash>.<ext>` y, con Pillow
+instalado, genera variantes redimensionadas por alto (`ICON_HEIGHTS`) para
+que los íconos de 32px no descarguen el logo completo. Escribe el mapa en
+`img/dist/manifest.json`.
+
+En la app, `init_assets(app)` hace que `url_for('static', filename=...)` devuelva
+la URL con huella (y `size=64` la variante de ese alto) y sirve esos archivos
+con `Cache-Control: public, max-age=31536000, immutable`. Sin manifest (p. ej.
+en desarrollo sin build) se usan las URLs originales.
+"""
+import io
+import os
+import sys
+import json
+import shutil
+import hashlib
+import logging
+from typing import Optional
+from flask import Flask, request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMG_DIR = os.path.join(ROOT, "img")
+DIST = "dist"
+MANIFEST = os.path.join(IMG_DIR, DIST, "manifest.json")
+# Altos de las variantes: 32px como se muestran los íconos y 64px para pantallas 2x.
+ICON_HEIGHTS = (32, 64)
+IMMUTABLE = "public, max-age=31536000, immutable"
+_EXTS = (".webp", ".png", ".jpg", ".jpeg", ".gif", ".svg")
+
+
+def _fingerprinted(rel: str, data: bytes, suffix: str = "") -> str:
+    base, ext = os.path.splitext(rel)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return f"{DIST}/{base}{suffix}.{digest}{ext}"
+
+
+def _write(root: str, rel_out: str, data: bytes) -> None:
+    path = os.path.join(root, rel_out)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _resized(data: bytes, height: int) -> Optional[bytes]:
+    """Variante de `height` px de alto (webp), o None si no hace falta o no hay Pillow."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(io.BytesIO(data)) as im:
+        if im.height <= height:
+            return None
+        width = max(1, round(im.width * height / im.height))
+        out = io.BytesIO()
+        im.resize((width, height), Image.LANCZOS).save(out, format="WEBP", quality=90, method=6)
+        return out.getvalue()
+
+
+def build(img_dir: str = IMG_DIR) -> dict[str, str]:
+    """Regenera `<img_dir>/dist/` y devuelve el manifest {nombre[@alto]: ruta con huella}."""
+    shutil.rmtree(os.path.join(img_dir, DIST), ignore_errors=True)
+    manifest: dict[str, str] = {}
+    for dirpath, dirnames, filenames in os.walk(img_dir):
+        dirnames[:] = [d for d in dirnames if d != DIST]
+        for name in sorted(filenames):
+            if not name.lower().endswith(_EXTS):
+                continue
+            rel = os.path.relpath(os.path.join(dirpath, name), img_dir).replace(os.sep, "/")
+            with open(os.path.join(dirpath, name), "rb") as f:
+                data = f.read()
+            manifest[rel] = _fingerprinted(rel, data)
+            _write(img_dir, manifest[rel], data)
+            if name.lower().endswith(".svg"):
+                continue
+            for h in ICON_HEIGHTS:
+                small = _resized(data, h)
+                if small is not None:
+                    out = _fingerprinted(os.path.splitext(rel)[0] + ".webp", small, f".h{h}")
+                    manifest[f"{rel}@{h}"] = out
+                    _write(img_dir, out, small)
+    os.makedirs(os.path.join(img_dir, DIST), exist_ok=True)
+    with open(os.path.join(img_dir, DIST, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+def load_manifest(path: str = MANIFEST) -> dict[str, str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        logging.warning("Manifest de assets ilegible (%s); se usan las URLs originales", path)
+        return {}
+
+
+def init_assets(app: Flask, manifest: Optional[dict[str, str]] = None) -> None:
+    """Reescribe `url_for('static', ...)` con el manifest y marca los archivos con huella como inmutables."""
+    manifest = load_manifest() if manifest is None else manifest
+    fingerprinted = set(manifest.values())
+
+    @app.url_defaults
+    def _static_fingerprint(endpoint, values):
+        if endpoint != 'static' or 'filename' not in values:
+            return
+        filename = values['filename']
+        size = values.pop('size', None)
+        if size is not None and f"{filename}@{size}" in manifest:
+            values['filename'] = manifest[f"{filename}@{size}"]
+        elif filename in manifest:
+            values['filename'] = manifest[filename]
+
+    @app.after_request
+    def _immutable_assets(resp):
+        if request.endpoint == 'static' and (request.view_args or {}).get('filename') in fingerprinted:
+            resp.headers['Cache-Control'] = IMMUTABLE
+        return resp
+
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else IMG_DIR
+    m = build(root)
+    variants = sum(1 for k in m if "@" in k)
+    print(f"{len(m) - variants} archivos, {variants} variantes -> {os.path.join(root, DIST)}")
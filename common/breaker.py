@@ -0,0 +1,131 @@
+"""
+Circuit breaker por host para la sesión HTTP compartida (`common.http`).
+
+- `closed`: las peticiones pasan; BREAKER_FAILURES fallos seguidos (excepción,
+  respuesta >= 500 o más lenta que BREAKER_SLOW_SECONDS) lo abren.
+- `open`: se falla al instante con `CircuitOpenError` (sin reintentos ni timeouts)
+  durante BREAKER_RESET_SECONDS.
+- `half_open`: pasado ese tiempo se deja pasar una petición de prueba; si sale
+  bien se cierra, si falla vuelve a abrirse.
+
+Mientras está abierto, los endpoints responden con la última respuesta buena
+guardada (hasta STALE_FALLBACK_TTL segundos) marcada como vieja.
+"""
+import os
+import time
+import threading
+import requests
+from common import metrics
+
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", "5"))
+BREAKER_SLOW_SECONDS = float(os.environ.get("BREAKER_SLOW_SECONDS", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", "30"))
+# Cuánto se conserva la última respuesta buena para servirla con el circuito abierto.
+STALE_FALLBACK_TTL = int(os.environ.get("STALE_FALLBACK_TTL", "86400"))
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """El circuito del host está abierto: no se intentó la petición."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failures: int = BREAKER_FAILURES,
+        slow_seconds: float = BREAKER_SLOW_SECONDS,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failures)
+        self.slow_seconds = slow_seconds
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def before(self) -> bool:
+        """
+        Lanza `CircuitOpenError` si la petición no debe intentarse. Devuelve True si
+        ésta es la petición de prueba del estado semiabierto: quien la recibe debe
+        llamar a `record()` o, si no hubo resultado, a `release_trial()`.
+        """
+        if self.state == "closed":
+            return False
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            if self.state == "closed":
+                return False
+            self.rejected += 1
+        raise CircuitOpenError(f"Circuito abierto para {self.name}")
+
+    def release_trial(self) -> None:
+        """Libera la prueba semiabierta sin resultado: la siguiente petición será la nueva prueba."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool, elapsed: float) -> None:
+        ok = ok and elapsed < self.slow_seconds
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self.state = "closed"
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def as_dict(self) -> dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    b = _breakers.get(name)
+    if b is None:
+        with _breakers_lock:
+            b = _breakers.setdefault(name, CircuitBreaker(name))
+    return b
+
+
+def breaker_states() -> dict[str, dict]:
+    """Estado de cada circuito por host (para /healthz y métricas)."""
+    return {name: b.as_dict() for name, b in list(_breakers.items())}
+
+
+_STATE_VALUE = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _breaker_metrics():
+    states = breaker_states()
+    return (
+        metrics.gauge_lines("circuit_breaker_state", "Estado del circuito por host (0 cerrado, 1 semiabierto, 2 abierto).", ("upstream",),
+                            (((h,), _STATE_VALUE[b['state']]) for h, b in states.items()))
+        + metrics.gauge_lines("circuit_breaker_opened_total", "Veces que se abrió el circuito.", ("upstream",),
+                              (((h,), b['times_opened']) for h, b in states.items()), kind="counter")
+        + metrics.gauge_lines("circuit_breaker_rejected_total", "Llamadas rechazadas con el circuito abierto.", ("upstream",),
+                              (((h,), b['rejected']) for h, b in states.items()), kind="counter")
+    )
+
+
+metrics.register_collector(_breaker_metrics)
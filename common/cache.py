@@ -1,24 +1,414 @@
+import os
+import sys
+import json
 import time
-from typing import Optional, Any
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Optional, Any, Callable
+from common.cache_backends import backend_from_url
+from common import deadline, metrics
+
+
+class _Entry:
+    # Entrada compacta: sin dict por entrada, solo slots.
+    # `stale_until` >= `expires`: hasta entonces se puede servir el valor viejo.
+    __slots__ = ('val', 'expires', 'stale_until', 'size')
+
+    def __init__(self, val: Any, expires: float, stale_until: float, size: int):
+        self.val = val
+        self.expires = expires
+        self.stale_until = stale_until
+        self.size = size
+
+
+_ENTRY_OVERHEAD = sys.getsizeof(_Entry(None, 0.0, 0.0, 0))
+
+
+def _sizeof(key: str, value: Any) -> int:
+    """Estimación barata del peso de una entrada (clave + valor + slots)."""
+    return sys.getsizeof(key) + sys.getsizeof(value) + _ENTRY_OVERHEAD
+
 
 class SimpleTTLCache:
-    def __init__(self, default_ttl: int = 15):
-        self._store: dict[str, dict[str, Any]] = {}
+    """
+    Caché en memoria con TTL por entrada, desalojo LRU y límites de tamaño.
+
+    - `max_entries`: número máximo de claves.
+    - `max_bytes`: presupuesto aproximado de memoria (clave + valor).
+    - Las entradas expiradas se barren de forma amortizada cada `sweep_interval` segundos.
+    - Segura entre hilos; expone contadores de aciertos, fallos y desalojos en `stats()`.
+    - `get_or_load()` carga cada clave una sola vez aunque haya peticiones concurrentes
+      y, dentro de la ventana `grace`, sirve el valor vencido mientras se refresca en segundo plano.
+
+    Para compartir la caché entre procesos ver `make_cache()` y `SharedTTLCache`.
+    """
+
+    # Reloj de las expiraciones; las cachés compartidas usan time.time (válido entre procesos).
+    _clock = staticmethod(time.monotonic)
+
+    def __init__(
+        self,
+        default_ttl: int = 15,
+        max_entries: int = 10_000,
+        max_bytes: int = 8 * 1024 * 1024,
+        sweep_interval: float = 30.0,
+    ):
         self.default_ttl = default_ttl
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.sweep_interval = sweep_interval
+        self._store: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self._next_sweep = self._clock() + sweep_interval
+        self._inflight: dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        self.loads = 0
 
     def get(self, key: str) -> Optional[Any]:
-        item = self._store.get(key)
-        if not item:
+        now = self._clock()
+        with self._lock:
+            item = self._store.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if now >= item.expires:
+                # Expirado (se conserva si aún está dentro de la ventana de gracia)
+                if now >= item.stale_until:
+                    self._remove(key, item)
+                    self.expirations += 1
+                self.misses += 1
+                return None
+            self._store.move_to_end(key)
+            self.hits += 1
+            return item.val
+
+    def get_with_ttl(self, key: str) -> Optional[tuple[Any, float]]:
+        """Como `get()`, pero devuelve (valor, segundos de frescura restantes) o None."""
+        item = self._peek(key)
+        now = self._clock()
+        with self._lock:
+            if item is None or now >= item.expires:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item.val, item.expires - now
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, grace: float = 0) -> None:
+        now = self._clock()
+        ttl = ttl if ttl is not None else self.default_ttl
+        entry = _Entry(value, now + ttl, now + ttl + max(0, grace), _sizeof(key, value))
+        with self._lock:
+            old = self._store.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._store[key] = entry
+            self._bytes += entry.size
+            if now >= self._next_sweep:
+                self._sweep(now)
+            self._enforce_limits()
+
+    def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Any],
+        ttl: Optional[int] = None,
+        grace: float = 0,
+    ) -> Any:
+        """
+        Devuelve el valor de `key` o lo calcula con `loader()` (single-flight).
+
+        - Fresco: se devuelve directamente.
+        - Vencido pero dentro de `grace`: se devuelve el valor viejo y se lanza
+          un único refresco en segundo plano.
+        - Ausente: el primer hilo ejecuta `loader()`; el resto espera su resultado
+          (como mucho lo que quede del deadline de la petición, ver `common.deadline`).
+          Las excepciones del loader se propagan a todos los que esperaban.
+        Si `loader()` devuelve None no se guarda nada.
+        """
+        now = self._clock()
+        item = self._peek(key)
+        if item is not None and now < item.expires:
+            with self._lock:
+                self.hits += 1
+            return item.val
+        if item is None:
+            with self._lock:
+                busy = key in self._inflight
+            if not busy:
+                # Otro hilo pudo terminar de cargarla tras el primer peek. Se vuelve a mirar
+                # fuera del lock: en `SharedTTLCache` el peek es I/O y bloquearía todas las claves.
+                item = self._peek(key)
+                if item is not None and now < item.expires:
+                    with self._lock:
+                        self.hits += 1
+                    return item.val
+        with self._lock:
+            fut = self._inflight.get(key)
+            if item is not None and now < item.stale_until:
+                self.stale_hits += 1
+                if fut is None:
+                    fut = self._inflight[key] = Future()
+                    threading.Thread(
+                        target=self._load, args=(key, loader, ttl, grace, fut, True),
+                        name=f"cache-refresh:{key}", daemon=True,
+                    ).start()
+                return item.val
+            self.misses += 1
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+        if leader:
+            self._load(key, loader, ttl, grace, fut)
+            return fut.result()
+        try:
+            return fut.result(timeout=deadline.remaining())
+        except FutureTimeout:
+            raise deadline.DeadlineExceeded(f"Sin tiempo esperando la carga de {key}") from None
+
+    def _peek(self, key: str) -> Optional[_Entry]:
+        """Entrada cruda (fresca, vencida o None) sin tocar contadores."""
+        with self._lock:
+            item = self._store.get(key)
+            if item is not None:
+                self._store.move_to_end(key)
+            return item
+
+    def _load(
+        self,
+        key: str,
+        loader: Callable[[], Any],
+        ttl: Optional[int],
+        grace: float,
+        fut: Future,
+        background: bool = False,
+    ) -> None:
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            if background:
+                logging.warning("Fallo refrescando %s en segundo plano; se mantiene el valor viejo", key, exc_info=e)
+            return
+        if value is not None:
+            self.set(key, value, ttl=ttl, grace=grace)
+        with self._lock:
+            self.loads += 1
+            self._inflight.pop(key, None)
+        fut.set_result(value)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            item = self._store.get(key)
+            if item is not None:
+                self._remove(key, item)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._store.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._store),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'stale_hits': self.stale_hits,
+                'loads': self.loads,
+            }
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    # Los helpers siguientes asumen que el lock ya está tomado.
+    def _remove(self, key: str, item: _Entry) -> None:
+        del self._store[key]
+        self._bytes -= item.size
+
+    def _sweep(self, now: float) -> None:
+        expired = [k for k, e in self._store.items() if now >= e.stale_until]
+        for k in expired:
+            self._remove(k, self._store[k])
+        self.expirations += len(expired)
+        self._next_sweep = now + self.sweep_interval
+
+    def _enforce_limits(self) -> None:
+        while self._store and (len(self._store) > self.max_entries or self._bytes > self.max_bytes):
+            k, e = self._store.popitem(last=False)
+            self._bytes -= e.size
+            self.evictions += 1
+
+
+# Clases que se pueden guardar en un backend compartido (ver `json_type`).
+_json_types: dict[str, type] = {}
+
+
+def json_type(cls):
+    """Registra una clase con `to_json()` y `from_json(data)` para `SharedTTLCache`."""
+    _json_types[cls.__name__] = cls
+    return cls
+
+
+def _json_default(obj: Any) -> Any:
+    name = type(obj).__name__
+    if _json_types.get(name) is type(obj):
+        return {'__type__': name, 'data': obj.to_json()}
+    raise TypeError(f"{name} no se puede guardar en una caché compartida")
+
+
+def _json_hook(d: dict) -> Any:
+    cls = _json_types.get(d.get('__type__')) if '__type__' in d else None
+    return cls.from_json(d['data']) if cls is not None else d
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _loads(payload: bytes) -> Any:
+    return json.loads(payload, object_hook=_json_hook)
+
+
+class SharedTTLCache(SimpleTTLCache):
+    """
+    Misma API que `SimpleTTLCache`, pero los valores viven en un backend compartido
+    entre procesos (SQLite o Redis, ver `common.cache_backends`).
+
+    Los valores se guardan como JSON (nunca pickle): str, números, listas y dicts,
+    más las clases registradas con `@json_type`. Las tuplas vuelven como listas.
+    El single-flight de `get_or_load()` es por proceso; la ventana `grace` sí se
+    comparte, con lo que un worker sirve lo que refrescó otro.
+    `max_entries` se aplica en el backend de forma aproximada: cada cierta cantidad de
+    escrituras (un 10% del límite) se recorta el namespace, empezando por lo que vence antes.
+    Si el backend falla, se comporta como un fallo de caché (nunca rompe la petición).
+    """
+
+    _clock = staticmethod(time.time)
+
+    def __init__(self, backend, namespace: str, default_ttl: int = 15, max_entries: int = 10_000):
+        super().__init__(default_ttl=default_ttl, max_entries=max_entries)
+        self.backend = backend
+        self.prefix = f"naye:{namespace}:"
+        self.trim_every = max(1, min(1024, self.max_entries // 10))
+        self._writes = 0
+
+    def _peek(self, key: str) -> Optional[_Entry]:
+        try:
+            rec = self.backend.get(self.prefix + key)
+        except Exception:
+            logging.warning("Backend de caché %s no disponible (get)", self.backend.name, exc_info=True)
+            return None
+        if rec is None:
             return None
-        if time.time() - item.get('ts', 0) > item.get('ttl', self.default_ttl):
-            # Expirado
-            self._store.pop(key, None)
+        payload, expires, stale_until = rec
+        try:
+            val = _loads(payload)
+        except ValueError:
+            # Entrada ilegible (p. ej. guardada por una versión anterior): cuenta como fallo de caché.
             return None
-        return item.get('val')
-
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        self._store[key] = {
-            'val': value,
-            'ts': time.time(),
-            'ttl': ttl if ttl is not None else self.default_ttl,
-        }
\ No newline at end of file
+        return _Entry(val, expires, stale_until, len(payload))
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._peek(key)
+        with self._lock:
+            if item is None or self._clock() >= item.expires:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item.val
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, grace: float = 0) -> None:
+        now = self._clock()
+        ttl = ttl if ttl is not None else self.default_ttl
+        try:
+            payload = _dumps(value)
+            self.backend.set(self.prefix + key, payload, now + ttl, now + ttl + max(0, grace))
+            with self._lock:
+                self._writes += 1
+                trim = self._writes % self.trim_every == 0
+            if trim:
+                self.evictions += self.backend.trim(self.prefix, self.max_entries)
+        except Exception:
+            logging.warning("Backend de caché %s no disponible (set)", self.backend.name, exc_info=True)
+
+    def delete(self, key: str) -> None:
+        try:
+            self.backend.delete(self.prefix + key)
+        except Exception:
+            logging.warning("Backend de caché %s no disponible (delete)", self.backend.name, exc_info=True)
+
+    def clear(self) -> None:
+        try:
+            self.backend.clear(self.prefix)
+        except Exception:
+            logging.warning("Backend de caché %s no disponible (clear)", self.backend.name, exc_info=True)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale_hits': self.stale_hits,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self) -> int:
+        try:
+            return self.backend.count(self.prefix)
+        except Exception:
+            return 0
+
+
+def make_cache(namespace: str, default_ttl: int = 15, **kwargs) -> SimpleTTLCache:
+    """
+    Caché según CACHE_BACKEND: `memory` (por defecto, `SimpleTTLCache` por proceso),
+    `sqlite[:///ruta]`, `redis://host:puerto/db` o `redis-local://` (ver `common.cache_backends`).
+    `namespace` separa las claves de cada módulo dentro de un backend compartido.
+    """
+    backend = backend_from_url(os.environ.get("CACHE_BACKEND", "memory"))
+    if backend is None:
+        cache = SimpleTTLCache(default_ttl=default_ttl, **kwargs)
+    else:
+        max_entries = kwargs.pop('max_entries', 10_000)
+        if kwargs:
+            # El backend compartido sólo sabe limitar por cantidad de entradas.
+            logging.warning("make_cache(%s): %s no se aplica con CACHE_BACKEND=%s", namespace, ", ".join(sorted(kwargs)), backend.name)
+        cache = SharedTTLCache(backend, namespace, default_ttl=default_ttl, max_entries=max_entries)
+    _named[namespace] = cache
+    return cache
+
+
+# Cachés creadas con make_cache(), por namespace, para /metrics.
+_named: dict[str, SimpleTTLCache] = {}
+
+
+def _cache_metrics():
+    stats = {name: c.stats() for name, c in list(_named.items())}
+    lines: list[str] = []
+    for field in ('hits', 'misses', 'stale_hits', 'evictions', 'loads'):
+        lines += metrics.gauge_lines(
+            f"cache_{field}_total", f"Contador `{field}` de la caché.", ("cache",),
+            (((n,), st.get(field)) for n, st in stats.items()), kind="counter",
+        )
+    lines += metrics.gauge_lines(
+        "cache_hit_ratio", "Aciertos / (aciertos + fallos) desde el arranque.", ("cache",),
+        (((n,), st['hits'] / (st['hits'] + st['misses']) if st['hits'] + st['misses'] else None) for n, st in stats.items()),
+    )
+    return lines
+
+
+metrics.register_collector(_cache_metrics)
@@ -0,0 +1,345 @@
+"""
+Backends de almacenamiento para `common.cache.SharedTTLCache`.
+
+Todos guardan bytes opacos junto a dos marcas de tiempo epoch (`expires`,
+`stale_until`) y se eligen con la variable de entorno CACHE_BACKEND:
+
+- `memory` (por defecto): sin backend, cada proceso tiene su `SimpleTTLCache`.
+- `sqlite` o `sqlite:///ruta/cache.sqlite3`: archivo SQLite compartido por los
+  workers de una misma máquina, sin dependencias. Sin ruta se usa un directorio
+  privado del usuario (ver `common.paths`).
+- `redis://host:6379/0`: cualquier servidor que hable el protocolo de Redis (RESP).
+- `redis-local://`: sustituto en memoria del cliente de Redis, para pruebas.
+"""
+import os
+import time
+import socket
+import sqlite3
+import struct
+import logging
+import threading
+import urllib.parse
+from typing import Optional
+from common.paths import private_file
+
+_HEADER = struct.Struct("!dd")  # expires, stale_until
+
+
+class CacheBackend:
+    """Interfaz mínima: get/set/delete por clave, y clear/count por prefijo."""
+
+    name = "base"
+
+    def get(self, key: str) -> Optional[tuple[bytes, float, float]]:
+        raise NotImplementedError
+
+    def set(self, key: str, payload: bytes, expires: float, stale_until: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self, prefix: str) -> None:
+        raise NotImplementedError
+
+    def count(self, prefix: str) -> int:
+        raise NotImplementedError
+
+    def trim(self, prefix: str, max_entries: int) -> int:
+        """Deja como mucho `max_entries` claves con `prefix` (se van las que vencen antes); devuelve cuántas borró."""
+        raise NotImplementedError
+
+
+class SQLiteBackend(CacheBackend):
+    """Tabla clave/valor en SQLite (modo WAL); cada proceso abre su propia conexión."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = 100_000, purge_every: int = 256):
+        self.path = path
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = 0
+        self._writes = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # Tras un fork la conexión heredada no se puede usar: se abre otra.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                " expires REAL NOT NULL, stale_until REAL NOT NULL)"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            row = self._db().execute(
+                "SELECT value, expires, stale_until FROM cache WHERE key = ? AND stale_until > ?",
+                (key, time.time()),
+            ).fetchone()
+        return (bytes(row[0]), row[1], row[2]) if row else None
+
+    def set(self, key, payload, expires, stale_until):
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, stale_until) VALUES (?, ?, ?, ?)",
+                (key, payload, expires, stale_until),
+            )
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                self._purge(db)
+
+    def _purge(self, db: sqlite3.Connection) -> None:
+        db.execute("DELETE FROM cache WHERE stale_until <= ?", (time.time(),))
+        excess = db.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            # Se descartan primero las que vencen antes
+            db.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY stale_until LIMIT ?)",
+                (excess,),
+            )
+
+    def delete(self, key):
+        with self._lock:
+            self._db().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self, prefix):
+        with self._lock:
+            self._db().execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def count(self, prefix):
+        with self._lock:
+            return self._db().execute(
+                "SELECT COUNT(*) FROM cache WHERE substr(key, 1, ?) = ? AND stale_until > ?",
+                (len(prefix), prefix, time.time()),
+            ).fetchone()[0]
+
+    def trim(self, prefix, max_entries):
+        with self._lock:
+            db = self._db()
+            excess = db.execute(
+                "SELECT COUNT(*) FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix),
+            ).fetchone()[0] - max_entries
+            if excess <= 0:
+                return 0
+            db.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache WHERE substr(key, 1, ?) = ?"
+                " ORDER BY stale_until LIMIT ?)",
+                (len(prefix), prefix, excess),
+            )
+            return excess
+
+
+class RedisError(Exception):
+    pass
+
+
+class RESPClient:
+    """Cliente mínimo del protocolo de Redis (RESP2) sobre un socket, sin dependencias."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0, password: Optional[str] = None, timeout: float = 1.0):
+        self.host, self.port, self.db, self.password, self.timeout = host, port, db, password, timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._buf: Optional[object] = None
+        self._pid = 0
+
+    def command(self, *args):
+        with self._lock:
+            try:
+                return self._roundtrip(args)
+            except (OSError, EOFError):
+                # Una reconexión por si el servidor cerró la conexión ociosa
+                self._close()
+                return self._roundtrip(args)
+
+    def _roundtrip(self, args):
+        if self._sock is None or self._pid != os.getpid():
+            self._connect()
+        self._sock.sendall(self._encode(args))
+        return self._read()
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._buf = self._sock.makefile("rb")
+        self._pid = os.getpid()
+        if self.password:
+            self._sock.sendall(self._encode(("AUTH", self.password)))
+            self._read()
+        if self.db:
+            self._sock.sendall(self._encode(("SELECT", self.db)))
+            self._read()
+
+    def _close(self) -> None:
+        try:
+            if self._sock is not None:
+                self._sock.close()
+        except OSError:
+            pass
+        self._sock = self._buf = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for a in args:
+            if not isinstance(a, bytes):
+                a = str(a).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(a), a))
+        return b"".join(out)
+
+    def _read(self):
+        line = self._buf.readline()
+        if not line:
+            raise EOFError("conexión cerrada por el servidor")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self._buf.read(n + 2)
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read() for _ in range(n)]
+        raise RedisError(f"respuesta RESP inesperada: {line!r}")
+
+
+class LocalRedisStandIn:
+    """Sustituto en memoria de `RESPClient` (GET/GETRANGE/SET PX/DEL/SCAN) para pruebas sin servidor."""
+
+    def __init__(self):
+        self._data: dict[bytes, tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    def command(self, *args):
+        cmd = str(args[0]).upper()
+        keys = [a if isinstance(a, bytes) else str(a).encode() for a in args[1:]]
+        now = time.time()
+        with self._lock:
+            if cmd == "PING":
+                return "PONG"
+            if cmd == "GET":
+                item = self._data.get(keys[0])
+                if item is None or item[1] <= now:
+                    self._data.pop(keys[0], None)
+                    return None
+                return item[0]
+            if cmd == "SET":
+                ttl = float(keys[3]) / 1000 if len(keys) > 3 and keys[2].upper() == b"PX" else 1e12
+                self._data[keys[0]] = (keys[1], now + ttl)
+                return "OK"
+            if cmd == "GETRANGE":
+                item = self._data.get(keys[0])
+                if item is None or item[1] <= now:
+                    return b""
+                return item[0][int(keys[1]):int(keys[2]) + 1]
+            if cmd == "DEL":
+                return sum(1 for k in keys if self._data.pop(k, None) is not None)
+            if cmd == "SCAN":
+                pattern = keys[2][:-1] if len(keys) > 2 else b""
+                live = [k for k, (_, exp) in self._data.items() if exp > now and k.startswith(pattern)]
+                return [b"0", live]
+        raise RedisError(f"comando no soportado por el sustituto local: {cmd}")
+
+
+class RedisBackend(CacheBackend):
+    """Guarda cada entrada como `SET key <expires,stale_until><payload> PX <ms hasta stale_until>`."""
+
+    name = "redis"
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        raw = self.client.command("GET", key)
+        if not raw or len(raw) < _HEADER.size:
+            return None
+        expires, stale_until = _HEADER.unpack_from(raw)
+        return raw[_HEADER.size:], expires, stale_until
+
+    def set(self, key, payload, expires, stale_until):
+        px = max(1, int((stale_until - time.time()) * 1000))
+        self.client.command("SET", key, _HEADER.pack(expires, stale_until) + payload, "PX", px)
+
+    def delete(self, key):
+        self.client.command("DEL", key)
+
+    def _scan(self, prefix: str) -> list:
+        keys, cursor = [], b"0"
+        while True:
+            cursor, batch = self.client.command("SCAN", cursor, "MATCH", prefix + "*", "COUNT", 500)
+            keys.extend(batch or [])
+            if cursor in (b"0", "0", 0):
+                return keys
+
+    def clear(self, prefix):
+        keys = self._scan(prefix)
+        for i in range(0, len(keys), 500):
+            self.client.command("DEL", *keys[i:i + 500])
+
+    def count(self, prefix):
+        return len(self._scan(prefix))
+
+    def trim(self, prefix, max_entries):
+        keys = self._scan(prefix)
+        excess = len(keys) - max_entries
+        if excess <= 0:
+            return 0
+        # Sólo se lee la cabecera de cada clave (expires, stale_until), no el valor.
+        ranked = []
+        for k in keys:
+            head = self.client.command("GETRANGE", k, 0, _HEADER.size - 1)
+            stale_until = _HEADER.unpack(head)[1] if head and len(head) == _HEADER.size else 0.0
+            ranked.append((stale_until, k))
+        ranked.sort()
+        doomed = [k for _, k in ranked[:excess]]
+        for i in range(0, len(doomed), 500):
+            self.client.command("DEL", *doomed[i:i + 500])
+        return len(doomed)
+
+
+_backends: dict[str, Optional[CacheBackend]] = {}
+_backends_lock = threading.Lock()
+
+
+def backend_from_url(url: str) -> Optional[CacheBackend]:
+    """Backend para CACHE_BACKEND (None = memoria local). Se reutiliza uno por URL."""
+    url = (url or "memory").strip()
+    with _backends_lock:
+        if url in _backends:
+            return _backends[url]
+        parsed = urllib.parse.urlparse(url if "://" in url else f"{url}://")
+        backend: Optional[CacheBackend]
+        if parsed.scheme in ("", "memory"):
+            backend = None
+        elif parsed.scheme == "sqlite":
+            path = parsed.path or private_file("cache.sqlite3")
+            if path is None:
+                logging.warning("No hay un directorio privado seguro para la caché SQLite; se usa memoria local")
+                backend = None
+            else:
+                backend = SQLiteBackend(path)
+        elif parsed.scheme == "redis":
+            db = int((parsed.path or "/0").lstrip("/") or 0)
+            backend = RedisBackend(RESPClient(parsed.hostname or "127.0.0.1", parsed.port or 6379, db, parsed.password))
+        elif parsed.scheme == "redis-local":
+            backend = RedisBackend(LocalRedisStandIn())
+        else:
+            logging.warning("CACHE_BACKEND desconocido (%s); se usa memoria local", url)
+            backend = None
+        _backends[url] = backend
+        return backend
@@ -0,0 +1,80 @@
+"""
+Presupuesto de tiempo por petición (deadline) para las llamadas a upstreams.
+
+Un comando de chat (Nightbot, StreamElements) espera unos pocos segundos; si
+HenrikDev o Twitch tardan, es mejor responder el texto de error/fallback a
+tiempo que agotar timeouts y reintentos de cada llamada encadenada.
+
+- `with_deadline(view)` aplica a una vista el presupuesto de su ruta
+  (`ROUTE_DEADLINES`, ajustable con REQUEST_DEADLINES="rango=3,followage=4").
+- La sesión de `common.http` lee `remaining()`: cada llamada recibe como timeout
+  sólo lo que queda, los reintentos paran al agotarse y, sin presupuesto, se lanza
+  `DeadlineExceeded` (un `requests.exceptions.Timeout`) sin tocar la red.
+- El deadline vive en un ContextVar: para trabajo en un pool usar `submit()`.
+"""
+import os
+import time
+import functools
+import contextvars
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Optional, Callable, Any
+import requests
+
+# Segundos por ruta (nombre de la vista); las rutas sin entrada no tienen deadline.
+REQUEST_DEADLINE = float(os.environ.get("REQUEST_DEADLINE", "4"))
+ROUTE_DEADLINES: dict[str, float] = {
+    "rango": REQUEST_DEADLINE,
+    "ultima_ranked": REQUEST_DEADLINE,
+    "followage": REQUEST_DEADLINE,
+    # Hasta 100 usuarios: una llamada a /users y follows en paralelo.
+    "followage_batch": 2 * REQUEST_DEADLINE,
+}
+for _item in (os.environ.get("REQUEST_DEADLINES") or "").split(","):
+    _name, _, _secs = _item.partition("=")
+    try:
+        ROUTE_DEADLINES[_name.strip()] = float(_secs)
+    except ValueError:
+        pass
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Se agotó el presupuesto de la petición antes de (o durante) una llamada."""
+
+
+def remaining() -> Optional[float]:
+    """Segundos que quedan del presupuesto actual, o None si no hay deadline."""
+    dl = _deadline.get()
+    return None if dl is None else dl - time.monotonic()
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Fija un deadline de `seconds`; uno ya activo más corto se respeta."""
+    new = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def with_deadline(view: Callable) -> Callable:
+    seconds = ROUTE_DEADLINES.get(view.__name__)
+    if not seconds or seconds <= 0:
+        return view
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with deadline(seconds):
+            return view(*args, **kwargs)
+
+    return wrapper
+
+
+def submit(pool: Executor, fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """`pool.submit()` conservando el deadline (y demás contexto) de quien llama."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
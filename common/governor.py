@@ -0,0 +1,205 @@
+"""
+Gobernador de cuota hacia los upstreams (Helix, HenrikDev).
+
+Un bucket por (host, credencial) aprende de las cabeceras `Ratelimit-Limit`,
+`Ratelimit-Remaining` y `Ratelimit-Reset` (también las variantes `X-RateLimit-*`
+y `Retry-After` de un 429) y descuenta localmente cada llamada en curso.
+
+- Prioridad `high` (peticiones de usuarios): si no queda cuota se espera al reset,
+  como mucho GOVERNOR_MAX_WAIT segundos y nunca más allá del deadline de la petición.
+- Prioridad `low` (comprobaciones de estado, refrescos de caché, hilos de fondo):
+  se descarta con `RateLimitShed` en cuanto la cuota baja de la reserva
+  (GOVERNOR_RESERVE, fracción del límite), para dejarla a los usuarios.
+
+Los hilos de fondo son `low` por defecto; `app.py` marca `high` cada petición HTTP.
+Sin cabeceras conocidas no se limita nada.
+"""
+import os
+import time
+import functools
+import hashlib
+import threading
+import contextvars
+import urllib.parse
+from contextlib import contextmanager
+from typing import Optional
+import requests
+from common import deadline, metrics
+
+GOVERNOR_MAX_WAIT = float(os.environ.get("GOVERNOR_MAX_WAIT", "2"))
+GOVERNOR_RESERVE = float(os.environ.get("GOVERNOR_RESERVE", "0.2"))
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("upstream_priority", default="low")
+
+
+class RateLimited(requests.exceptions.RequestException):
+    """Sin cuota para llamar al upstream dentro del tiempo disponible."""
+
+
+class RateLimitShed(RateLimited):
+    """Llamada de baja prioridad descartada para reservar cuota a los usuarios."""
+
+
+def set_priority(priority: str) -> contextvars.Token:
+    return _priority.set(priority)
+
+
+def reset_priority(token: contextvars.Token) -> None:
+    _priority.reset(token)
+
+
+@contextmanager
+def low_priority():
+    token = _priority.set("low")
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def with_low_priority(view):
+    """Vista cuyas llamadas a upstreams ceden la cuota a las de los usuarios (p. ej. /twitch/status)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with low_priority():
+            return view(*args, **kwargs)
+
+    return wrapper
+
+
+def _header(resp, *names) -> Optional[float]:
+    for name in names:
+        value = resp.headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                continue
+    return None
+
+
+class _Bucket:
+    __slots__ = ('limit', 'remaining', 'reset_at', 'shed', 'waited', 'lock')
+
+    def __init__(self):
+        self.limit: Optional[float] = None
+        self.remaining: Optional[float] = None
+        self.reset_at = 0.0  # epoch
+        self.shed = 0
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.remaining is not None and now >= self.reset_at:
+            # Pasado el reset se asume la cuota completa (o desconocida) hasta que el upstream diga otra cosa.
+            self.remaining = self.limit or None
+
+    def acquire(self, priority: str, name: str) -> None:
+        while True:
+            with self.lock:
+                now = time.time()
+                self._refill(now)
+                if self.remaining is None:
+                    return
+                reserve = max(1.0, (self.limit or 0) * GOVERNOR_RESERVE) if priority == "low" else 0.0
+                if self.remaining > reserve:
+                    self.remaining -= 1
+                    return
+                if priority == "low":
+                    self.shed += 1
+                    raise RateLimitShed(f"Cuota de {name} reservada para usuarios")
+                wait = self.reset_at - now
+            left = deadline.remaining()
+            budget = GOVERNOR_MAX_WAIT if left is None else min(GOVERNOR_MAX_WAIT, left)
+            if wait > budget:
+                raise RateLimited(f"Sin cuota para {name} (reset en {wait:.1f}s)")
+            time.sleep(max(0.0, wait))
+            with self.lock:
+                self.waited += max(0.0, wait)
+
+    def observe(self, resp) -> None:
+        limit = _header(resp, "Ratelimit-Limit", "X-RateLimit-Limit")
+        remaining = _header(resp, "Ratelimit-Remaining", "X-RateLimit-Remaining")
+        reset = _header(resp, "Ratelimit-Reset", "X-RateLimit-Reset")
+        if resp.status_code == 429:
+            remaining = 0
+            if reset is None:
+                reset = _header(resp, "Retry-After")
+        if remaining is None:
+            return
+        now = time.time()
+        with self.lock:
+            if limit is not None:
+                self.limit = limit
+            elif self.limit is None or remaining > self.limit:
+                self.limit = remaining or None
+            self.remaining = remaining
+            if reset is not None:
+                # Helix manda epoch; otros upstreams, segundos hasta el reset.
+                self.reset_at = reset if reset > 1e9 else now + reset
+            elif self.reset_at <= now:
+                self.reset_at = now + 60
+
+    def as_dict(self) -> dict:
+        return {
+            'limit': self.limit,
+            'remaining': self.remaining,
+            'reset_in': round(max(0.0, self.reset_at - time.time()), 1),
+            'shed': self.shed,
+            'waited_seconds': round(self.waited, 3),
+        }
+
+
+_buckets: dict[str, _Bucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_key(request) -> str:
+    """`host` o `host:<huella de la credencial>` (Authorization, Client-ID o ?api_key=)."""
+    parsed = urllib.parse.urlsplit(request.url)
+    cred = request.headers.get("Authorization") or request.headers.get("Client-ID")
+    if not cred:
+        cred = (urllib.parse.parse_qs(parsed.query).get("api_key") or [""])[0]
+    host = parsed.hostname or ""
+    if not cred:
+        return host
+    return f"{host}:{hashlib.sha256(cred.encode()).hexdigest()[:8]}"
+
+
+def _bucket(key: str) -> _Bucket:
+    b = _buckets.get(key)
+    if b is None:
+        with _buckets_lock:
+            b = _buckets.setdefault(key, _Bucket())
+    return b
+
+
+def acquire(key: str) -> None:
+    """Reserva una llamada; lanza `RateLimited`/`RateLimitShed` si no puede hacerse."""
+    _bucket(key).acquire(_priority.get(), key.split(":", 1)[0])
+
+
+def observe(key: str, resp) -> None:
+    _bucket(key).observe(resp)
+
+
+def governor_states() -> dict[str, dict]:
+    """Cuota conocida por bucket: límite, restante, segundos al reset, descartes y espera acumulada."""
+    return {key: b.as_dict() for key, b in list(_buckets.items())}
+
+
+def _governor_metrics():
+    states = governor_states()
+    return (
+        metrics.gauge_lines("upstream_quota_remaining", "Cuota restante conocida por bucket (host:credencial).", ("bucket",),
+                            (((k,), b['remaining']) for k, b in states.items()))
+        + metrics.gauge_lines("upstream_quota_limit", "Límite de cuota conocido por bucket.", ("bucket",),
+                              (((k,), b['limit']) for k, b in states.items()))
+        + metrics.gauge_lines("upstream_quota_reset_seconds", "Segundos hasta el reset de la cuota.", ("bucket",),
+                              (((k,), b['reset_in']) for k, b in states.items()))
+        + metrics.gauge_lines("upstream_quota_shed_total", "Llamadas de baja prioridad descartadas.", ("bucket",),
+                              (((k,), b['shed']) for k, b in states.items()), kind="counter")
+    )
+
+
+metrics.register_collector(_governor_metrics)
@@ -0,0 +1,126 @@
+"""
+Estado de las dependencias externas para `/healthz`.
+
+Un hilo de fondo consulta cada dependencia cada HEALTHZ_INTERVAL segundos y
+guarda estado, código HTTP y latencia en memoria; `/healthz` sólo lee ese
+estado (no hace I/O). `/livez` es la comprobación de vida: responde sin tocar
+nada externo.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Optional
+import requests
+
+HEALTHZ_INTERVAL = int(os.environ.get("HEALTHZ_INTERVAL", "30"))
+HEALTHZ_TIMEOUT = float(os.environ.get("HEALTHZ_TIMEOUT", "3"))
+
+# nombre -> URL; cualquier respuesta < 500 cuenta como disponible (401/404 incluidos).
+DEFAULT_CHECKS = {
+    "henrikdev": "https://api.henrikdev.xyz/valorant/version",
+    "twitch": "https://api.twitch.tv/helix/",
+}
+
+
+class _DepState:
+    __slots__ = ('status', 'http_status', 'latency_ms', 'checked_at', 'error', 'failures')
+
+    def __init__(self):
+        self.status = "starting"  # aún sin sondear
+        self.http_status: Optional[int] = None
+        self.latency_ms: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.failures = 0
+
+    def as_dict(self) -> dict:
+        return {
+            'status': self.status,
+            'http_status': self.http_status,
+            'latency_ms': self.latency_ms,
+            'checked_at': self.checked_at,
+            'error': self.error,
+            'consecutive_failures': self.failures,
+        }
+
+
+class HealthChecker:
+    """
+    Sondea `checks` ({nombre: url}) en segundo plano.
+
+    - `snapshot()` devuelve el último estado conocido; el hilo arranca con la primera llamada.
+    - Cada sonda es una sola petición (sin reintentos) con timeout HEALTHZ_TIMEOUT.
+    - Hasta su primera sonda una dependencia está `starting` (y el estado global también);
+      si luego no se sondea hace más de tres intervalos pasa a `unknown`.
+    """
+
+    def __init__(self, checks: dict[str, str], interval: int = HEALTHZ_INTERVAL, timeout: float = HEALTHZ_TIMEOUT):
+        self.checks = dict(checks)
+        self.interval = max(1, interval)
+        self.timeout = timeout
+        self._state = {name: _DepState() for name in self.checks}
+        self._session = requests.Session()
+        self._session.headers["User-Agent"] = os.environ.get("API_USER_AGENT", "NayeAPIs/1.0")
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def probe(self, name: str) -> None:
+        st = self._state[name]
+        t0 = time.perf_counter()
+        try:
+            r = self._session.get(self.checks[name], timeout=self.timeout, allow_redirects=False)
+            r.close()
+            st.http_status, st.error = r.status_code, None
+            ok = r.status_code < 500
+        except requests.exceptions.RequestException as e:
+            st.http_status, st.error = None, type(e).__name__
+            ok = False
+        st.latency_ms = round((time.perf_counter() - t0) * 1000, 1)
+        st.checked_at = time.time()
+        st.failures = 0 if ok else st.failures + 1
+        st.status = "up" if ok else "down"
+
+    def probe_all(self) -> None:
+        for name in self.checks:
+            try:
+                self.probe(name)
+            except Exception:
+                logging.exception("Error sondeando %s", name)
+
+    def snapshot(self) -> tuple[str, dict[str, dict]]:
+        """(estado global, estado por dependencia): `ok`, `degraded`, `down` o `starting`."""
+        self._ensure_running()
+        now = time.time()
+        deps = {}
+        for name, st in self._state.items():
+            d = st.as_dict()
+            if st.checked_at is not None and now - st.checked_at > 3 * self.interval:
+                d['status'] = "unknown"
+            deps[name] = d
+        statuses = [d['status'] for d in deps.values()]
+        if any(s == "starting" for s in statuses):
+            overall = "starting"
+        elif all(s == "up" for s in statuses):
+            overall = "ok"
+        elif any(s == "up" for s in statuses):
+            overall = "degraded"
+        else:
+            overall = "down"
+        return overall, deps
+
+    def _ensure_running(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="healthz-checker", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self.probe_all()
+            time.sleep(self.interval)
+
+
+checker = HealthChecker(DEFAULT_CHECKS)
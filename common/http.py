@@ -1,27 +1,298 @@
 import os
+import time
+import threading
+import contextvars
+from typing import Optional
 import requests
 from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import MaxRetryError
+from common.breaker import get_breaker
+from common import deadline, governor, metrics, profiling
 try:
     from urllib3.util import Retry
 except Exception:
     from urllib3.util.retry import Retry  # type: ignore
 
+# Timeouts separados: conectar debe ser rápido; leer puede tardar más.
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "10"))
 
-def get_session(user_agent: str | None = None) -> requests.Session:
-    ua = user_agent or os.environ.get("API_USER_AGENT", "NayeAPIs/1.0")
+# Tamaño del pool keep-alive por host. Se puede ajustar con
+# HTTP_POOL_SIZES="api.twitch.tv=16,api.henrikdev.xyz=8".
+DEFAULT_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "4"))
+POOL_SIZES: dict[str, int] = {
+    "api.henrikdev.xyz": 8,
+    "api.twitch.tv": 10,
+    "id.twitch.tv": 4,
+}
+for _item in (os.environ.get("HTTP_POOL_SIZES") or "").split(","):
+    _host, _, _size = _item.partition("=")
+    if _host.strip() and _size.strip().isdigit():
+        POOL_SIZES[_host.strip()] = int(_size)
+
+
+def timeouts(read: float | None = None) -> tuple[float, float]:
+    """Tupla (connect, read) para `requests`; `read` permite alargar llamadas lentas."""
+    return (CONNECT_TIMEOUT, read if read is not None else READ_TIMEOUT)
+
+
+class _PoolStats:
+    __slots__ = ('requests', 'new_connections', 'wait_seconds')
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.wait_seconds = 0.0
+
+
+_stats: dict[str, _PoolStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _host_stats(host: str) -> _PoolStats:
+    st = _stats.get(host)
+    if st is None:
+        with _stats_lock:
+            st = _stats.setdefault(host, _PoolStats())
+    return st
+
+
+class _InstrumentedPoolMixin:
+    # Cuenta conexiones nuevas (handshake TCP+TLS) y el tiempo esperando un slot libre.
+    def _new_conn(self):
+        _host_stats(self.host).new_connections += 1
+        return super()._new_conn()
+
+    def _get_conn(self, timeout=None):
+        t0 = time.perf_counter()
+        try:
+            return super()._get_conn(timeout)
+        finally:
+            _host_stats(self.host).wait_seconds += time.perf_counter() - t0
+
+
+class _HTTPPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PooledAdapter(HTTPAdapter):
+    """
+    HTTPAdapter con pools instrumentados, timeout (connect, read) por defecto y
+    circuit breaker por host (ver `common.breaker`): con el circuito abierto se
+    falla al instante con `CircuitOpenError` en vez de agotar reintentos y timeouts.
+
+    Con un deadline activo (`common.deadline`) los reintentos se hacen aquí en vez
+    de en urllib3, para dar a cada intento sólo el tiempo que queda. Antes de
+    enviar se pide cuota al gobernador (`common.governor`) y se aprende de la respuesta.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _HTTPPool, "https": _HTTPSPool}
+
+    # urllib3 lee `max_retries` en cada envío: dentro de un deadline se desactivan sus reintentos.
+    @property
+    def max_retries(self):
+        return _NO_RETRY if _single_attempt.get() else self._max_retries
+
+    @max_retries.setter
+    def max_retries(self, value):
+        self._max_retries = value
+
+    def send(self, request, timeout=None, **kwargs):
+        up = _Upstream(request)
+        connect, read = _split_timeout(timeout)
+        if deadline.remaining() is None:
+            trial = up.breaker.before()
+            self._acquire_quota(up, trial)
+            return self._attempt(request, up, (connect, read), False, trial, **kwargs)
+
+        retry, resp, quota = self._max_retries, None, False
+        token = _single_attempt.set(True)
+        try:
+            while True:
+                left = deadline.remaining()
+                if left <= 0:
+                    if resp is not None:
+                        return resp
+                    raise deadline.DeadlineExceeded(f"Sin tiempo para llamar a {up.host}", request=request)
+                trial = up.breaker.before()
+                if not quota:
+                    # Los intentos siguientes no vuelven a pedir cuota.
+                    self._acquire_quota(up, trial)
+                    quota = True
+                try:
+                    resp = self._attempt(request, up, (min(connect, left), min(read, left)), left < read, trial, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    if request.method not in (retry.allowed_methods or ()):
+                        raise
+                    retry = _next_retry(retry, request)
+                    if retry is None:
+                        raise
+                else:
+                    if not retry.is_retry(request.method, resp.status_code):
+                        return resp
+                    retry = _next_retry(retry, request)
+                    if retry is None:
+                        return resp
+                    resp.close()
+                metrics.UPSTREAM_RETRIES.inc(up.host, up.op)
+                left = deadline.remaining()
+                time.sleep(max(0.0, min(retry.get_backoff_time(), left)))
+        finally:
+            _single_attempt.reset(token)
+
+    @staticmethod
+    def _acquire_quota(up: "_Upstream", trial: bool) -> None:
+        # Después del breaker: con el circuito abierto no se gasta cuota (ver `common.governor`).
+        try:
+            governor.acquire(up.quota)
+        except BaseException:
+            if trial:
+                up.breaker.release_trial()
+            raise
+
+    def _attempt(self, request, up: "_Upstream", timeout, truncated, trial=False, **kwargs):
+        _host_stats(up.host).requests += 1
+        recorded = False
+        t0 = time.monotonic()
+        try:
+            try:
+                resp = super().send(request, timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                elapsed = time.monotonic() - t0
+                # Un timeout recortado por el deadline no dice nada de la salud del host.
+                if not (truncated and isinstance(e, requests.exceptions.Timeout)):
+                    up.breaker.record(False, elapsed)
+                    recorded = True
+                metrics.UPSTREAM_REQUESTS.inc(up.host, up.op, type(e).__name__)
+                metrics.UPSTREAM_SECONDS.observe(elapsed, up.host, up.op)
+                if profiling.active():
+                    profiling.add_span("upstream", f"{up.host} {up.op}", profiling.since_start() - elapsed, elapsed, status=type(e).__name__)
+                raise
+            elapsed = time.monotonic() - t0
+            up.breaker.record(resp.status_code < 500, elapsed)
+            recorded = True
+        finally:
+            # Una prueba semiabierta sin resultado (p. ej. cortada por el deadline) libera el
+            # turno; si no, el circuito quedaría semiabierto rechazando todo para siempre.
+            if trial and not recorded:
+                up.breaker.release_trial()
+        governor.observe(up.quota, resp)
+        metrics.UPSTREAM_REQUESTS.inc(up.host, up.op, str(resp.status_code))
+        metrics.UPSTREAM_SECONDS.observe(elapsed, up.host, up.op)
+        retries = getattr(resp.raw, "retries", None)
+        if retries is not None and retries.history:
+            metrics.UPSTREAM_RETRIES.inc(up.host, up.op, amount=len(retries.history))
+        if profiling.active():
+            profiling.add_span("upstream", f"{up.host} {up.op}", profiling.since_start() - elapsed, elapsed, status=resp.status_code,
+                               retries=len(retries.history) if retries is not None else 0)
+        return resp
+
+
+class _Upstream:
+    """Destino de una llamada: host, operación (para métricas), bucket de cuota y circuit breaker."""
+    __slots__ = ('host', 'op', 'quota', 'breaker')
+
+    def __init__(self, request):
+        parsed = requests.utils.urlparse(request.url)
+        self.host = parsed.hostname or ""
+        self.op = metrics.upstream_op(self.host, parsed.path)
+        self.quota = governor.bucket_key(request)
+        self.breaker = get_breaker(self.host)
+
+
+_single_attempt: contextvars.ContextVar[bool] = contextvars.ContextVar("http_single_attempt", default=False)
+_NO_RETRY = Retry(0, read=False)
+
+
+def _split_timeout(timeout) -> tuple[float, float]:
+    if timeout is None:
+        return timeouts()
+    if isinstance(timeout, tuple):
+        c, r = timeout
+        return (c if c is not None else CONNECT_TIMEOUT, r if r is not None else READ_TIMEOUT)
+    return (timeout, timeout)
+
+
+def _next_retry(retry: Retry, request) -> Optional[Retry]:
+    """Siguiente estado de reintentos, o None si ya no quedan."""
+    try:
+        return retry.increment(request.method, request.url)
+    except MaxRetryError:
+        return None
+
+
+def _retry() -> Retry:
+    return Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["GET", "POST", "PUT", "DELETE", "HEAD", "OPTIONS"],
+    )
+
+
+def _build_session(ua: str) -> requests.Session:
     s = requests.Session()
     s.headers.update({
         "User-Agent": ua,
         "Connection": "keep-alive",
     })
+    default = _PooledAdapter(max_retries=_retry(), pool_maxsize=DEFAULT_POOL_SIZE)
+    s.mount("http://", default)
+    s.mount("https://", default)
+    for host, size in POOL_SIZES.items():
+        s.mount(f"https://{host}/", _PooledAdapter(max_retries=_retry(), pool_maxsize=size))
+    return s
 
-    retry = Retry(
-        total=3,
-        backoff_factor=0.3,
-        status_forcelist=[500, 502, 503, 504],
-        allowed_methods=["GET", "POST", "PUT", "DELETE", "HEAD", "OPTIONS"],
+
+_sessions: dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(user_agent: str | None = None) -> requests.Session:
+    """
+    Sesión HTTP compartida por todo el proceso (una por User-Agent).
+
+    Reutiliza conexiones keep-alive por host, aplica reintentos con backoff y
+    timeouts (connect, read) por defecto cuando la llamada no indica uno.
+    """
+    ua = user_agent or os.environ.get("API_USER_AGENT", "NayeAPIs/1.0")
+    s = _sessions.get(ua)
+    if s is None:
+        with _sessions_lock:
+            s = _sessions.get(ua)
+            if s is None:
+                s = _sessions[ua] = _build_session(ua)
+    return s
+
+
+def pool_stats() -> dict[str, dict[str, float]]:
+    """Por host: peticiones, conexiones nuevas, reutilizadas y segundos esperando el pool."""
+    out = {}
+    for host, st in list(_stats.items()):
+        out[host] = {
+            'requests': st.requests,
+            'new_connections': st.new_connections,
+            'reused': max(0, st.requests - st.new_connections),
+            'wait_seconds': round(st.wait_seconds, 6),
+        }
+    return out
+
+
+def _pool_metrics():
+    stats = pool_stats()
+    return (
+        metrics.gauge_lines("upstream_new_connections_total", "Conexiones nuevas (handshake) por host.", ("upstream",),
+                            (((h,), st['new_connections']) for h, st in stats.items()), kind="counter")
+        + metrics.gauge_lines("upstream_pool_wait_seconds_total", "Segundos esperando un slot del pool por host.", ("upstream",),
+                              (((h,), st['wait_seconds']) for h, st in stats.items()), kind="counter")
     )
-    adapter = HTTPAdapter(max_retries=retry)
-    s.mount("http://", adapter)
-    s.mount("https://", adapter)
-    return s
\ No newline at end of file
+
+
+metrics.register_collector(_pool_metrics)
@@ -0,0 +1,184 @@
+"""
+Métricas en formato de texto de Prometheus para `/metrics`.
+
+Contadores e histogramas sin locks en el camino caliente: cada hilo suma en su
+propio dict (un solo escritor por dict) y `render()` agrega todos al exportar.
+Los valores que ya viven en otros módulos (cachés, circuit breakers, cuota de
+upstreams, pools HTTP) se leen al exportar mediante `register_collector()`.
+
+Las métricas son por proceso: con varios workers de gunicorn cada scrape ve
+sólo el worker que lo atendió (el comentario `# naye pid=...` de la salida dice
+cuál, pero no es una etiqueta: Prometheus lo ignora).
+"""
+import os
+import re
+import threading
+import weakref
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+
+# Segundos; cubren desde respuestas en memoria hasta upstreams lentos.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+_shards: list[dict] = []
+# Totales de hilos que ya terminaron (sus shards se suman aquí y se descartan).
+_retired: dict = {}
+_shards_lock = threading.Lock()
+
+
+class _Owner:
+    # Vive en el threading.local del hilo: se libera cuando el hilo termina.
+    __slots__ = ('__weakref__',)
+
+
+def _retire(d: dict) -> None:
+    with _shards_lock:
+        for i, shard in enumerate(_shards):
+            if shard is d:
+                del _shards[i]
+                break
+        for k, v in d.items():
+            _retired[k] = _retired.get(k, 0) + v
+
+
+def _shard() -> dict:
+    d = getattr(_local, "d", None)
+    if d is None:
+        d = _local.d = {}
+        _local.owner = _Owner()
+        weakref.finalize(_local.owner, _retire, d)
+        with _shards_lock:
+            _shards.append(d)
+    return d
+
+
+def _snapshot() -> dict:
+    # dict.copy() es atómico bajo el GIL aunque otro hilo escriba en ese shard.
+    with _shards_lock:
+        shards = list(_shards)
+        total = dict(_retired)
+    for d in shards:
+        for k, v in d.copy().items():
+            total[k] = total.get(k, 0) + v
+    return total
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        _metrics.append(self)
+
+    def inc(self, *values: str, amount: float = 1) -> None:
+        d = _shard()
+        key = (self.name, values)
+        d[key] = d.get(key, 0) + amount
+
+    def render(self, data: dict) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for (name, values), v in sorted((k, v) for k, v in data.items() if k[0] == self.name):
+            yield f"{name}{_labels(self.labels, values)} {_num(v)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, tuple(buckets)
+        _metrics.append(self)
+
+    def observe(self, value: float, *values: str) -> None:
+        d = _shard()
+        idx = bisect_left(self.buckets, value)
+        k = (self.name, values, idx)
+        d[k] = d.get(k, 0) + 1
+        k = (self.name, values, "sum")
+        d[k] = d.get(k, 0) + value
+
+    def render(self, data: dict) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        series: dict[tuple, dict] = {}
+        for key, v in data.items():
+            if key[0] == self.name and len(key) == 3:
+                series.setdefault(key[1], {})[key[2]] = v
+        for values in sorted(series):
+            per = series[values]
+            acc = 0
+            for i, le in enumerate(self.buckets):
+                acc += per.get(i, 0)
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), values + (_num(le),))} {_num(acc)}"
+            acc += per.get(len(self.buckets), 0)
+            yield f"{self.name}_bucket{_labels(self.labels + ('le',), values + ('+Inf',))} {_num(acc)}"
+            yield f"{self.name}_sum{_labels(self.labels, values)} {_num(per.get('sum', 0))}"
+            yield f"{self.name}_count{_labels(self.labels, values)} {_num(acc)}"
+
+
+_metrics: list = []
+# Cada collector devuelve líneas ya formateadas (con sus # HELP/# TYPE).
+_collectors: list[Callable[[], Iterable[str]]] = []
+
+
+def register_collector(fn: Callable[[], Iterable[str]]) -> None:
+    _collectors.append(fn)
+
+
+def gauge_lines(name: str, help: str, labels: tuple[str, ...], rows: Iterable[tuple[tuple, Optional[float]]], kind: str = "gauge") -> list[str]:
+    """Líneas de un gauge (o counter leído al exportar) a partir de filas (valores de etiquetas, número)."""
+    out = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for values, v in rows:
+        if v is not None:
+            out.append(f"{name}{_labels(labels, tuple(str(x) for x in values))} {_num(v)}")
+    return out
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) and not float(v).is_integer() else str(int(v))
+
+
+def render() -> str:
+    data = _snapshot()
+    lines = [f'# naye pid="{os.getpid()}"']
+    for m in _metrics:
+        lines.extend(m.render(data))
+    for fn in _collectors:
+        try:
+            lines.extend(fn())
+        except Exception:
+            lines.append(f"# collector {getattr(fn, '__name__', fn)} falló")
+    return "\n".join(lines) + "\n"
+
+
+# Métricas compartidas por la app y la capa HTTP
+REQUESTS = Counter("http_requests_total", "Peticiones atendidas por ruta, método y status.", ("route", "method", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Latencia por ruta.", ("route",))
+RATELIMIT_REJECTIONS = Counter("ratelimit_rejections_total", "Peticiones rechazadas por el rate limiter.", ("route", "limit"))
+UPSTREAM_REQUESTS = Counter("upstream_requests_total", "Llamadas a upstreams por operación y resultado.", ("upstream", "op", "status"))
+UPSTREAM_SECONDS = Histogram("upstream_request_duration_seconds", "Duración de cada llamada a un upstream (con sus reintentos de urllib3).", ("upstream", "op"))
+UPSTREAM_RETRIES = Counter("upstream_retries_total", "Reintentos hacia upstreams.", ("upstream", "op"))
+
+_VERSION_SEG = re.compile(r"^v\d+$")
+
+
+def upstream_op(host: str, path: str) -> str:
+    """Nombre acotado de la operación (sin logins ni IDs): `mmr`, `matches`, `users`, `channels/followers`, `oauth2/token`..."""
+    segs = [s for s in path.split("/") if s]
+    if host == "api.henrikdev.xyz":
+        for i, s in enumerate(segs):
+            if _VERSION_SEG.match(s) and i + 1 < len(segs):
+                return segs[i + 1]
+        return segs[-1] if segs else ""
+    if host == "api.twitch.tv" and segs[:1] == ["helix"]:
+        return "/".join(segs[1:3])
+    if host == "id.twitch.tv":
+        return "/".join(segs[:2])
+    return segs[0] if segs else ""
@@ -0,0 +1,83 @@
+"""
+Páginas HTML índice renderizadas una sola vez por host/esquema.
+
+`memoized_page` envuelve una vista que devuelve HTML: la primera petición para
+cada (vista, esquema, host, raíz) la renderiza, la minifica y guarda el cuerpo
+junto a sus variantes gzip/brotli (brotli sólo si el paquete está instalado) y
+un ETag fuerte por variante. Las siguientes se sirven desde memoria y un
+`If-None-Match` que coincide responde `304 Not Modified`.
+"""
+import re
+import gzip
+import hashlib
+import functools
+from typing import Optional
+from flask import Response, request
+from common.cache import SimpleTTLCache
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None
+
+# El HTML sólo cambia con un deploy; el host llega del cliente, por eso se acota el número de entradas.
+PAGE_TTL = 24 * 3600
+CACHE_CONTROL = "public, max-age=300"
+_pages = SimpleTTLCache(default_ttl=PAGE_TTL, max_entries=256)
+_BETWEEN_TAGS = re.compile(r">\n<")
+
+
+class _Page:
+    __slots__ = ('variants', 'etags')
+
+    def __init__(self, html: bytes):
+        tag = hashlib.sha256(html).hexdigest()[:20]
+        # codificación -> (cuerpo, etag); cada representación lleva su propio ETag fuerte
+        self.variants: dict[Optional[str], tuple[bytes, str]] = {None: (html, tag)}
+        self.variants["gzip"] = (gzip.compress(html, compresslevel=9, mtime=0), f"{tag}-gz")
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(html), f"{tag}-br")
+        self.etags = [etag for _, etag in self.variants.values()]
+
+
+def minify_html(html: str) -> str:
+    """Quita la indentación y las líneas vacías; el espacio dentro de una línea se conserva."""
+    lines = (line.strip() for line in html.splitlines())
+    return _BETWEEN_TAGS.sub("><", "\n".join(line for line in lines if line))
+
+
+def _pick_encoding(page: _Page) -> Optional[str]:
+    accepted = request.accept_encodings
+    for enc in ("br", "gzip"):
+        if enc in page.variants and accepted[enc]:
+            return enc
+    return None
+
+
+def memoized_page(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (view.__name__, request.scheme, request.host, request.script_root)
+        page = _pages.get(key)
+        if page is None:
+            rendered = view(*args, **kwargs)
+            if not isinstance(rendered, Response) or rendered.status_code != 200:
+                return rendered
+            page = _Page(minify_html(rendered.get_data(as_text=True)).encode("utf-8"))
+            _pages.set(key, page)
+
+        encoding = _pick_encoding(page)
+        body, etag = page.variants[encoding]
+        match = request.if_none_match
+        if match and (match.star_tag or any(match.contains_weak(t) for t in page.etags)):
+            resp = Response(status=304)
+        else:
+            resp = Response(body, mimetype="text/html")
+            if encoding:
+                resp.headers['Content-Encoding'] = encoding
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = CACHE_CONTROL
+        resp.headers['Vary'] = 'Accept-Encoding'
+        return resp
+
+    return wrapper
@@ -0,0 +1,42 @@
+"""
+Directorio privado para archivos de estado locales (caché SQLite, etc.).
+
+El directorio temporal del sistema es compartido: un archivo con nombre fijo ahí
+lo puede crear antes cualquier usuario de la máquina. Por eso los archivos por
+defecto van en `<tmp>/naye-<uid>`, creado con permisos 0700 y verificado (dueño,
+permisos, que no sea un symlink) antes de usarlo.
+"""
+import os
+import stat
+import tempfile
+from typing import Optional
+
+
+def private_dir() -> Optional[str]:
+    """Ruta del directorio privado, o None si no existe uno seguro (se loguea quien llame)."""
+    path = os.path.join(tempfile.gettempdir(), f"naye-{os.getuid()}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        return None
+    return path
+
+
+def private_file(name: str) -> Optional[str]:
+    """`<private_dir>/<name>` si el directorio es seguro y el archivo (si existe) es nuestro y no es un symlink."""
+    base = private_dir()
+    if base is None:
+        return None
+    path = os.path.join(base, name)
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return path
+    if not stat.S_ISREG(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o022:
+        return None
+    return path
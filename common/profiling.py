@@ -0,0 +1,193 @@
+"""
+Perfilado opcional de peticiones y registro de peticiones lentas.
+
+Desactivado por defecto: sin PROFILE_SAMPLE_RATE ni PROFILE_TOKEN no se instala
+ningún hook y el costo es cero. Activado:
+
+- Toda petición registra spans baratos: tiempo hasta pasar el rate limiter, cada
+  llamada a un upstream (con su status y reintentos) y los bloques marcados con
+  `span()` (p. ej. el parseo del JSON de v3/matches).
+- Una fracción PROFILE_SAMPLE_RATE de peticiones, o las que traen la cabecera
+  `X-Profile-Token` con PROFILE_TOKEN, se perfilan además con cProfile (sólo el
+  hilo de la petición y una a la vez).
+- Las peticiones de más de PROFILE_SLOW_MS (y todas las perfiladas a pedido)
+  quedan en un ring buffer de PROFILE_RING_SIZE entradas, visible en
+  `/debug/slow` con el mismo token.
+"""
+import io
+import os
+import hmac
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+from flask import Flask, Response, g, request, jsonify, request_started
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "1000"))
+PROFILE_RING_SIZE = int(os.environ.get("PROFILE_RING_SIZE", "50"))
+ENABLED = PROFILE_SAMPLE_RATE > 0 or bool(PROFILE_TOKEN)
+
+# Parámetros cuyo valor no se guarda en el registro.
+_SECRET_ARGS = ("password", "token", "code", "secret")
+
+_spans: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("profile_spans", default=None)
+_origin: contextvars.ContextVar[float] = contextvars.ContextVar("profile_origin", default=0.0)
+_ring: deque = deque(maxlen=max(1, PROFILE_RING_SIZE))
+_ring_lock = threading.Lock()
+# cProfile no admite dos perfiles activos a la vez en todas las versiones de Python.
+_cpu_lock = threading.Lock()
+
+
+def active() -> bool:
+    return _spans.get() is not None
+
+
+def add_span(kind: str, name: str, started: float, duration: float, **extra) -> None:
+    """Agrega un span a la petición en curso (no hace nada si no se está registrando)."""
+    spans = _spans.get()
+    if spans is not None:
+        spans.append({'kind': kind, 'name': name, 'start_ms': round(started * 1000, 2),
+                      'ms': round(duration * 1000, 2), **extra})
+
+
+@contextmanager
+def span(kind: str, name: str):
+    """Mide un bloque como span; sin registro activo sólo cuesta una lectura de ContextVar."""
+    spans = _spans.get()
+    if spans is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(kind, name, t0 - _origin.get(), time.perf_counter() - t0)
+
+
+def since_start() -> float:
+    """Segundos desde el inicio de la petición registrada (para `add_span`)."""
+    return time.perf_counter() - _origin.get()
+
+
+def _authorized(value: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and bool(value) and hmac.compare_digest(value.encode(), PROFILE_TOKEN.encode())
+
+
+def _safe_query() -> str:
+    parts = []
+    for k, v in request.args.items(multi=True):
+        parts.append(f"{k}=***" if any(s in k.lower() for s in _SECRET_ARGS) else f"{k}={v}")
+    return "&".join(parts)
+
+
+def _start(sender, **extra) -> None:
+    forced = _authorized(request.headers.get("X-Profile-Token"))
+    g.profile_tokens = (_spans.set([]), _origin.set(time.perf_counter()))
+    g.profile_forced = forced
+    g.profile_cpu = None
+    if (forced or random.random() < PROFILE_SAMPLE_RATE) and _cpu_lock.acquire(blocking=False):
+        prof = cProfile.Profile()
+        prof.enable()
+        g.profile_cpu = prof
+
+
+def _after_limiter() -> None:
+    # Corre después del before_request de Flask-Limiter: lo anterior es limiter + routing.
+    if active():
+        add_span("app", "rate limiter", 0.0, since_start())
+
+
+def _stop():
+    """Cierra el registro de la petición en curso; devuelve (spans, segundos, perfil, forzada) o None."""
+    tokens = g.pop('profile_tokens', None)
+    if tokens is None:
+        return None
+    total = since_start()
+    spans = _spans.get() or []
+    prof = g.pop('profile_cpu', None)
+    if prof is not None:
+        prof.disable()
+        _cpu_lock.release()
+    _spans.reset(tokens[0])
+    _origin.reset(tokens[1])
+    return spans, total, prof, g.pop('profile_forced', False)
+
+
+def _finish(resp: Response) -> Response:
+    done = _stop()
+    if done is None:
+        return resp
+    spans, total, prof, forced = done
+    if total * 1000 < PROFILE_SLOW_MS and not forced:
+        return resp
+
+    entry = {
+        'id': uuid.uuid4().hex[:12],
+        'at': time.time(),
+        'method': request.method,
+        'path': request.path,
+        'query': _safe_query(),
+        'status': resp.status_code,
+        'ms': round(total * 1000, 2),
+        'spans': spans,
+        'profile': None,
+    }
+    if prof is not None:
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(30)
+        entry['profile'] = out.getvalue()
+    with _ring_lock:
+        _ring.append(entry)
+    if forced:
+        resp.headers['X-Profile-Id'] = entry['id']
+    return resp
+
+
+def _teardown(exc=None) -> None:
+    # Si una excepción saltó los after_request, el perfil no puede quedar encendido.
+    _stop()
+
+
+def slow_requests() -> list[dict]:
+    with _ring_lock:
+        return list(_ring)
+
+
+def debug_slow():
+    """Ring buffer de peticiones lentas (`?id=` devuelve el perfil de una en texto)."""
+    if not PROFILE_TOKEN:
+        return Response("Not Found", status=404, content_type='text/plain; charset=utf-8')
+    given = request.headers.get("X-Profile-Token") or (request.headers.get("Authorization") or "").removeprefix("Bearer ").strip()
+    if not _authorized(given):
+        return Response("No autorizado.", status=401, content_type='text/plain; charset=utf-8')
+    wanted = request.args.get("id")
+    entries = slow_requests()
+    if wanted:
+        for e in entries:
+            if e['id'] == wanted:
+                body = e['profile'] or "(sin perfil de CPU: la petición no fue muestreada)"
+                return Response(body, content_type='text/plain; charset=utf-8', headers={'Cache-Control': 'no-store'})
+        return Response("No encontrado.", status=404, content_type='text/plain; charset=utf-8')
+    resp = jsonify([{k: v for k, v in e.items() if k != 'profile'} | {'has_profile': e['profile'] is not None}
+                    for e in reversed(entries)])
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
+def init_profiling(app: Flask) -> bool:
+    """Instala los hooks si el perfilado está activo; devuelve si quedó instalado."""
+    if not ENABLED:
+        return False
+    request_started.connect(_start, app)
+    app.before_request(_after_limiter)
+    app.after_request(_finish)
+    app.teardown_request(_teardown)
+    return True
@@ -0,0 +1,158 @@
+"""
+Storage `sqlite://` para Flask-Limiter (paquete `limits`).
+
+Con varios workers en la misma máquina, `memory://` aplica el límite por proceso
+(el límite real se multiplica por el número de workers). Este storage guarda los
+contadores en un archivo SQLite compartido:
+
+    RATELIMIT_STORAGE_URI=sqlite:///var/lib/naye/ratelimit.sqlite3
+    RATELIMIT_STORAGE_URI=sqlite://            (archivo en el directorio privado, ver common/paths.py)
+
+Soporta las estrategias `fixed-window` y `sliding-window-counter`; en la segunda,
+leer ambas ventanas e incrementar ocurre en una sola transacción (atómico).
+Importar este módulo basta para registrar el esquema.
+"""
+import os
+import time
+import sqlite3
+import threading
+from math import floor
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+from common.paths import private_file
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS counters ("
+    " key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)"
+)
+# Suma `amount` si la ventana sigue viva; si expiró, reinicia contador y expiración.
+_UPSERT = (
+    "INSERT INTO counters (key, count, expires) VALUES (?1, ?2, ?3 + ?4)"
+    " ON CONFLICT(key) DO UPDATE SET"
+    "  count = CASE WHEN expires <= ?3 THEN excluded.count ELSE count + excluded.count END,"
+    "  expires = CASE WHEN expires <= ?3 THEN excluded.expires ELSE expires END"
+    " RETURNING count"
+)
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str | None = None, wrap_exceptions: bool = False, purge_every: int = 1000, **options):
+        path = (uri or "").split("://", 1)[-1] if uri else ""
+        path = path or private_file("ratelimit.sqlite3")
+        if path is None:
+            # Un archivo en un directorio ajeno permitiría alterar o reiniciar los límites.
+            raise RuntimeError("No hay un directorio privado seguro para el rate limiter; define RATELIMIT_STORAGE_URI=sqlite:///ruta")
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _db(self) -> sqlite3.Connection:
+        # Una conexión por hilo (y por proceso, por si hubo fork): lecturas en paralelo con WAL.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _maybe_purge(self, db: sqlite3.Connection, now: float) -> None:
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            db.execute("DELETE FROM counters WHERE expires <= ?", (now,))
+
+    def _get(self, db: sqlite3.Connection, key: str, now: float) -> int:
+        row = db.execute("SELECT count FROM counters WHERE key = ? AND expires > ?", (key, now)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        now = time.time()
+        db = self._db()
+        count = db.execute(_UPSERT, (key, amount, now, expiry)).fetchone()[0]
+        self._maybe_purge(db, now)
+        return count
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        now = time.time()
+        db = self._db()
+        db.execute(
+            "UPDATE counters SET count = MAX(count - ?, 0) WHERE key = ? AND expires > ?",
+            (amount, key, now),
+        )
+        return self._get(db, key, now)
+
+    def get(self, key: str) -> int:
+        return self._get(self._db(), key, time.time())
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._db().execute(
+            "SELECT expires FROM counters WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._db().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int | None:
+        db = self._db()
+        n = db.execute("SELECT COUNT(*) FROM counters").fetchone()[0]
+        db.execute("DELETE FROM counters")
+        return n
+
+    def clear(self, key: str) -> None:
+        self._db().execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    # Sliding window counter
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        db = self._db()
+        # BEGIN IMMEDIATE toma el lock de escritura: leer y sumar es atómico entre procesos.
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            previous_count, previous_ttl, current_count, _ = self._window(db, previous_key, current_key, expiry, now)
+            weighted = previous_count * previous_ttl / expiry + current_count
+            if floor(weighted) + amount > limit:
+                db.execute("COMMIT")
+                return False
+            db.execute(_UPSERT, (current_key, amount, now, 2 * expiry)).fetchone()
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._maybe_purge(db, now)
+        return True
+
+    def _window(self, db, previous_key: str, current_key: str, expiry: int, now: float) -> tuple[int, float, int, float]:
+        previous_count = self._get(db, previous_key, now)
+        current_count = self._get(db, current_key, now)
+        previous_ttl = 0.0 if previous_count == 0 else (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        return self._window(self._db(), previous_key, current_key, expiry, now)
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        self.clear(previous_key)
+        self.clear(current_key)
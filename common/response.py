@@ -1,4 +1,33 @@
-from flask import Response
+import hashlib
+from typing import Optional
+from flask import Response, request
 
 def text_response(body: str, status: int = 200):
-    return Response(body, content_type='text/plain; charset=utf-8', status=status)
\ No newline at end of file
+    return Response(body, content_type='text/plain; charset=utf-8', status=status)
+
+
+def cached_text_response(body: str, max_age: float, stale_while_revalidate: float = 0, last_modified: Optional[float] = None):
+    """
+    Respuesta 200 cacheable por clientes y CDN: `max_age` y `stale_while_revalidate`
+    salen de la caché del servidor, el ETag es un hash del texto y `last_modified`
+    (epoch) la hora de los datos. Un GET condicional que coincide recibe 304.
+    """
+    resp = text_response(body)
+    cc = f"public, max-age={max(0, int(max_age))}"
+    if stale_while_revalidate > 0:
+        cc += f", stale-while-revalidate={int(stale_while_revalidate)}"
+    resp.headers['Cache-Control'] = cc
+    resp.set_etag(hashlib.sha256(body.encode('utf-8')).hexdigest()[:20])
+    if last_modified:
+        resp.last_modified = last_modified
+    return resp.make_conditional(request)
+
+
+def stale_text_response(body: str, age_seconds: float):
+    """Última respuesta buena servida con el upstream caído: marca de antigüedad en el texto y en `X-Stale-Age`."""
+    minutes = int(age_seconds // 60)
+    edad = f"hace {minutes} min" if minutes else "hace menos de un minuto"
+    resp = text_response(f"{body} (datos de {edad})")
+    resp.headers['X-Stale-Age'] = str(int(age_seconds))
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
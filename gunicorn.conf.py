@@ -0,0 +1,30 @@
+# Configuración de gunicorn (modo producción). Todo se ajusta por variables de entorno.
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Procesos y hilos por proceso. Los endpoints pasan casi todo el tiempo esperando a
+# HenrikDev/Twitch, así que los hilos rinden más que los procesos.
+workers = int(os.environ.get("WEB_CONCURRENCY", min(2, multiprocessing.cpu_count())))
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+worker_class = "gthread"
+
+# Un worker que no responde en `timeout` se reinicia; al recibir SIGHUP/SIGTERM se
+# le dan `graceful_timeout` segundos para terminar las peticiones en curso.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "20"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+# Reciclado gradual de workers (0 = nunca); el jitter evita que reinicien todos a la vez.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "50"))
+
+# Sin preload: cada worker importa la app después del fork, así las sesiones HTTP,
+# los pools de hilos y los hilos de fondo (poller, renovación de token) son propios
+# de cada worker y no se heredan a medias del proceso maestro.
+preload_app = False
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
@@ -1,32 +1,24 @@
-import time
-from typing import Optional
+from typing import Optional, Iterable
 import os
-import requests
-from .config import CLIENT_ID, CLIENT_SECRET, APP_TOKEN as CONFIG_APP_TOKEN, USER_ACCESS_TOKEN
+from .config import CLIENT_ID, APP_TOKEN as CONFIG_APP_TOKEN, USER_ACCESS_TOKEN
+from .app_token import app_tokens
+from common.cache import make_cache
+from common.http import get_session, timeouts
 
-APP_TOKEN = None
-APP_TOKEN_EXPIRY = 0
+# Sesión compartida: keep-alive hacia api.twitch.tv e id.twitch.tv en vez de un handshake por llamada.
+_session = get_session()
 
-def get_app_token():
-    global APP_TOKEN, APP_TOKEN_EXPIRY
-    now = time.time()
-    if APP_TOKEN and now < APP_TOKEN_EXPIRY:
-        return APP_TOKEN
+# Índice login→ID. Los IDs de Twitch no cambian, así que se guardan por mucho tiempo;
+# los logins inexistentes se guardan como "" (entrada negativa) con un TTL corto.
+ID_TTL = int(os.environ.get("TWITCH_ID_TTL", str(7 * 24 * 3600)))
+ID_NEGATIVE_TTL = int(os.environ.get("TWITCH_ID_NEGATIVE_TTL", "600"))
+_ids = make_cache("twitch_ids", default_ttl=ID_TTL, max_entries=50_000)
+# Helix /users acepta hasta 100 parámetros `login` por llamada.
+USERS_BATCH = 100
 
-    url = "https://id.twitch.tv/oauth2/token"
-    data = {
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "grant_type": "client_credentials",
-    }
-    r = requests.post(url, data=data, timeout=10)
-    r.raise_for_status()
-    payload = r.json()
-    APP_TOKEN = payload.get("access_token")
-    expires_in = payload.get("expires_in", 0)
-    # Renueva el token 60s antes de expirar
-    APP_TOKEN_EXPIRY = now + int(expires_in) - 60
-    return APP_TOKEN
+def get_app_token():
+    """App access token compartido (ver `twitch.app_token.AppTokenManager`)."""
+    return app_tokens.get()
 
 def _headers():
     token = CONFIG_APP_TOKEN or get_app_token()
@@ -55,7 +47,7 @@ def create_clip(channel: str, has_delay: bool | None = None, user_token: str | N
     body = {"broadcaster_id": broadcaster_id}
     if has_delay is not None:
         body["has_delay"] = bool(has_delay)
-    resp = requests.post(url, headers=_headers_user(token_to_use), json=body, timeout=20)
+    resp = _session.post(url, headers=_headers_user(token_to_use), json=body, timeout=timeouts(read=20))
     resp.raise_for_status()
     payload = resp.json()
     items = payload.get("data", [])
@@ -65,7 +57,7 @@ def create_clip(channel: str, has_delay: bool | None = None, user_token: str | N
 def get_clip_url(clip_id: str):
     url = "https://api.twitch.tv/helix/clips"
     params = {"id": clip_id}
-    resp = requests.get(url, headers=_headers(), params=params, timeout=10)
+    resp = _session.get(url, headers=_headers(), params=params, timeout=timeouts())
     resp.raise_for_status()
     payload = resp.json()
     data = payload.get("data", [])
@@ -73,20 +65,50 @@ def get_clip_url(clip_id: str):
         return None
     return data[0].get("url")
 
-def get_user_id(login: str) -> Optional[str]:
+def get_user_ids(logins: Iterable[str]) -> dict[str, Optional[str]]:
+    """
+    Resuelve varios logins a IDs. Usa el índice en memoria y consulta a Helix
+    sólo los que faltan, en lotes de hasta 100 por llamada.
+    Devuelve {login en minúsculas: id o None si no existe}.
+    """
+    result: dict[str, Optional[str]] = {}
+    missing: list[str] = []
+    for login in logins:
+        login = (login or "").strip().lower()
+        if not login or login in result:
+            continue
+        cached = _ids.get(login)
+        if cached is None:
+            missing.append(login)
+            result[login] = None
+        else:
+            result[login] = cached or None
+
     url = "https://api.twitch.tv/helix/users"
-    params = {"login": login}
-    r = requests.get(url, headers=_headers(), params=params, timeout=10)
-    r.raise_for_status()
-    data = r.json().get("data", [])
-    if not data:
-        return None
-    return data[0].get("id")
+    for i in range(0, len(missing), USERS_BATCH):
+        batch = missing[i:i + USERS_BATCH]
+        r = _session.get(url, headers=_headers(), params=[("login", l) for l in batch], timeout=timeouts())
+        r.raise_for_status()
+        found = {
+            (u.get("login") or "").lower(): u.get("id")
+            for u in r.json().get("data", [])
+        }
+        for login in batch:
+            user_id = found.get(login)
+            if user_id:
+                _ids.set(login, user_id)
+            else:
+                _ids.set(login, "", ttl=ID_NEGATIVE_TTL)
+            result[login] = user_id or None
+    return result
+
+def get_user_id(login: str) -> Optional[str]:
+    return get_user_ids([login]).get((login or "").strip().lower())
 
 def get_follow_info(follower_id: str, channel_id: str):
     url = "https://api.twitch.tv/helix/channels/followers"
     params = {"broadcaster_id": channel_id, "user_id": follower_id, "first": 1}
-    r = requests.get(url, headers=_headers_user(), params=params, timeout=10)
+    r = _session.get(url, headers=_headers_user(), params=params, timeout=timeouts())
     r.raise_for_status()
     data = r.json()
     items = data.get("data", [])
@@ -95,6 +117,17 @@ def get_follow_info(follower_id: str, channel_id: str):
     follow = items[0]
     return follow
 
+def get_followers_page(channel_id: str, after: Optional[str] = None, first: int = 100) -> tuple[list[dict], Optional[str]]:
+    """Una página de seguidores (más recientes primero). Devuelve (items, cursor siguiente)."""
+    url = "https://api.twitch.tv/helix/channels/followers"
+    params = {"broadcaster_id": channel_id, "first": first}
+    if after:
+        params["after"] = after
+    r = _session.get(url, headers=_headers_user(), params=params, timeout=timeouts())
+    r.raise_for_status()
+    data = r.json()
+    return data.get("data", []), (data.get("pagination") or {}).get("cursor")
+
 def validate_token(token: str) -> dict:
     """
     Valida un token contra https://id.twitch.tv/oauth2/validate
@@ -102,6 +135,6 @@ def validate_token(token: str) -> dict:
     """
     url = "https://id.twitch.tv/oauth2/validate"
     headers = {"Authorization": f"Bearer {token}"}
-    r = requests.get(url, headers=headers, timeout=10)
+    r = _session.get(url, headers=headers, timeout=timeouts())
     r.raise_for_status()
     return r.json()
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Optional
+from .config import CLIENT_ID, CLIENT_SECRET
+from common.http import get_session, timeouts
+from common.paths import private_file
+
+_session = get_session()
+
+TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+# Archivo donde se persiste el token para que otros procesos/reinicios lo reutilicen.
+# Por defecto va en el directorio privado del usuario (ver common/paths.py); si no hay
+# uno seguro, o con TWITCH_TOKEN_FILE="", no se persiste.
+TOKEN_FILE = os.environ.get("TWITCH_TOKEN_FILE")
+if TOKEN_FILE is None:
+    TOKEN_FILE = private_file("twitch_app_token.json")
+# Se renueva en segundo plano este tiempo antes de que expire.
+RENEW_BEFORE = int(os.environ.get("TWITCH_TOKEN_RENEW_BEFORE", "3600"))
+# Margen mínimo: un token que expira en menos de esto no se entrega.
+EXPIRY_MARGIN = 60
+
+
+class AppTokenManager:
+    """
+    App access token (client_credentials) compartido por todo el proceso.
+
+    - Una sola petición a /oauth2/token aunque varias lleguen a la vez (lock + doble chequeo).
+    - Un hilo lo renueva `RENEW_BEFORE` segundos antes de `expires_in`.
+    - Se persiste en `TOKEN_FILE` con su expiración, ligado al client_id,
+      para que workers nuevos y reinicios lo reutilicen.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, path: Optional[str] = TOKEN_FILE):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.path = path or None
+        self._token: Optional[str] = None
+        self._expires_at = 0.0  # epoch: comparable entre procesos
+        self._lock = threading.Lock()
+        self._renewer: Optional[threading.Thread] = None
+        self._loaded = False
+
+    def get(self) -> Optional[str]:
+        if self._valid():
+            return self._token
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                self._load()
+            if not self._valid():
+                self._fetch()
+            self._ensure_renewer()
+            return self._token
+
+    def invalidate(self) -> None:
+        """Descarta el token actual (p. ej. tras un 401) para forzar uno nuevo."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+    @property
+    def expires_at(self) -> float:
+        return self._expires_at
+
+    def _valid(self) -> bool:
+        return bool(self._token) and time.time() < self._expires_at - EXPIRY_MARGIN
+
+    def _fetch(self) -> None:
+        data = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "client_credentials",
+        }
+        r = _session.post(TOKEN_URL, data=data, timeout=timeouts())
+        r.raise_for_status()
+        payload = r.json()
+        self._token = payload.get("access_token")
+        self._expires_at = time.time() + int(payload.get("expires_in", 0))
+        self._save()
+
+    def _fingerprint(self) -> str:
+        return hashlib.sha256(self.client_id.encode()).hexdigest()[:16]
+
+    def _load(self) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception:
+            logging.warning("No se pudo leer %s; se pedirá un token nuevo", self.path)
+            return
+        if stored.get("client") != self._fingerprint():
+            return
+        if float(stored.get("expires_at", 0)) <= self._expires_at:
+            return
+        self._token = stored.get("access_token")
+        self._expires_at = float(stored.get("expires_at", 0))
+
+    def _save(self) -> None:
+        if not self.path or not self._token:
+            return
+        tmp = None
+        try:
+            # Temporal con nombre aleatorio (O_EXCL, 0600) en el mismo directorio y rename atómico.
+            fd, tmp = tempfile.mkstemp(prefix=".twitch_app_token.", suffix=".tmp", dir=os.path.dirname(self.path) or ".")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({
+                    "client": self._fingerprint(),
+                    "access_token": self._token,
+                    "expires_at": self._expires_at,
+                }, f)
+            os.replace(tmp, self.path)
+        except Exception:
+            logging.warning("No se pudo persistir el token de app en %s", self.path)
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    def _ensure_renewer(self) -> None:
+        if self._renewer is None or not self._renewer.is_alive():
+            self._renewer = threading.Thread(target=self._renew_loop, name="twitch-token-renewer", daemon=True)
+            self._renewer.start()
+
+    def _renew_loop(self) -> None:
+        while True:
+            wait = self._expires_at - RENEW_BEFORE - time.time()
+            time.sleep(max(30.0, wait))
+            if time.time() < self._expires_at - RENEW_BEFORE:
+                continue
+            try:
+                with self._lock:
+                    # Otro proceso pudo renovarlo ya: se prefiere el del archivo si es más nuevo.
+                    self._load()
+                    if time.time() >= self._expires_at - RENEW_BEFORE:
+                        self._fetch()
+            except Exception:
+                logging.exception("Error renovando el token de app de Twitch")
+
+
+app_tokens = AppTokenManager(CLIENT_ID, CLIENT_SECRET)
@@ -0,0 +1,188 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import requests
+from common.cache import SimpleTTLCache, SharedTTLCache, make_cache
+from common.deadline import submit
+from .api import create_clip, get_clip_url
+
+# Modo asíncrono de /twitch/clip: los clips se crean y resuelven en este pool
+# para no bloquear a los workers HTTP durante segundos.
+CLIP_WORKERS = int(os.environ.get("TWITCH_CLIP_WORKERS", "2"))
+# Tiempo que se conserva el resultado de un job para consultarlo.
+CLIP_JOB_TTL = int(os.environ.get("TWITCH_CLIP_JOB_TTL", "600"))
+# Pedidos de clip del mismo canal dentro de esta ventana (segundos desde el primero)
+# comparten un único create_clip(); 0 lo desactiva.
+CLIP_COALESCE_WINDOW = float(os.environ.get("TWITCH_CLIP_COALESCE_WINDOW", "5"))
+_pool = ThreadPoolExecutor(max_workers=max(1, CLIP_WORKERS), thread_name_prefix="twitch-clip")
+_jobs = SimpleTTLCache(default_ttl=CLIP_JOB_TTL, max_entries=1_000)
+# Con varios workers, `/twitch/clip/<job>` puede caer en otro worker: el estado del job se
+# publica también en la caché compartida (CACHE_BACKEND). Sin ella el modo asíncrono se
+# desactiva y `?async=1` responde de forma síncrona.
+MULTI_WORKER = int(os.environ.get("WEB_CONCURRENCY", "1")) > 1
+_shared = make_cache("twitch_clip_jobs", default_ttl=CLIP_JOB_TTL, max_entries=1_000) if MULTI_WORKER else None
+if not isinstance(_shared, SharedTTLCache):
+    _shared = None
+ASYNC_ENABLED = not MULTI_WORKER or _shared is not None
+# Último job por canal, para fusionar pedidos casi simultáneos.
+_recent = SimpleTTLCache(default_ttl=int(CLIP_COALESCE_WINDOW) + 60, max_entries=1_000)
+_recent_lock = threading.Lock()
+
+
+def _twitch_error_text(e: requests.exceptions.HTTPError) -> str:
+    status = getattr(e.response, "status_code", 500)
+    msg = ""
+    try:
+        body = e.response.json()
+        msg = body.get("message") or body.get("error") or ""
+    except Exception:
+        try:
+            msg = e.response.text[:200]
+        except Exception:
+            msg = ""
+    return f"Error de Twitch ({status}): {msg}"
+
+
+def _resolve_clip_url(clip_obj: dict) -> str:
+    """Espera a que Twitch publique el clip y normaliza la URL a clips.twitch.tv/<slug>."""
+    clip_id = clip_obj.get("id") or ""
+    edit_url = (clip_obj.get("edit_url") or "").strip()
+    clip_url = ""
+    try:
+        for _ in range(3):
+            u = (get_clip_url(clip_id) or "").strip()
+            if u:
+                clip_url = u
+                break
+            time.sleep(0.4)
+    except Exception:
+        pass
+    if not clip_url:
+        clip_url = edit_url
+    if clip_url.endswith("/edit"):
+        clip_url = clip_url[:-5]
+    if "/clip/" in clip_url:
+        try:
+            slug = clip_url.rsplit("/clip/", 1)[1].split("/")[0]
+            if slug:
+                clip_url = f"https://clips.twitch.tv/{slug}"
+        except Exception:
+            pass
+    return clip_url
+
+
+def make_clip(channel_login: str, has_delay: bool = False) -> tuple[str, int]:
+    """Crea un clip y devuelve (texto de respuesta, status HTTP)."""
+    try:
+        clip_obj = create_clip(channel_login, has_delay=has_delay)
+    except RuntimeError as e:
+        return str(e), 500
+    except requests.exceptions.HTTPError as e:
+        return _twitch_error_text(e), 502
+    except requests.exceptions.RequestException:
+        return "No se pudo contactar a la API de Twitch.", 502
+    except Exception:
+        logging.exception("Error inesperado en /twitch/clip")
+        return "Error inesperado al crear clip.", 500
+
+    if not clip_obj:
+        return "No se pudo crear el clip (¿canal no está en vivo?).", 502
+    return _resolve_clip_url(clip_obj) or "", 200
+
+
+class ClipJob:
+    __slots__ = ('id', 'channel', 'text', 'status', 'done', 'started')
+
+    def __init__(self, channel: str, job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.channel = channel
+        self.text = ""
+        self.status = 202
+        self.done = threading.Event()
+        self.started = time.monotonic()
+
+
+def _job_for(channel_login: str, has_delay: bool) -> tuple[ClipJob, bool]:
+    """
+    Job al que se suma este pedido: el del canal (con el mismo `has_delay`) si sigue
+    en curso o empezó hace menos de CLIP_COALESCE_WINDOW segundos; si no, uno nuevo.
+    Devuelve (job, es_nuevo).
+    """
+    key = f"{channel_login}:{int(has_delay)}"
+    with _recent_lock:
+        job = _recent.get(key)
+        if job is not None and CLIP_COALESCE_WINDOW > 0 and (
+            not job.done.is_set() or time.monotonic() - job.started < CLIP_COALESCE_WINDOW
+        ):
+            return job, False
+        job = ClipJob(channel_login)
+        _recent.set(key, job)
+        _jobs.set(job.id, job)
+        return job, True
+
+
+def _publish(job: ClipJob) -> None:
+    if _shared is not None:
+        _shared.set(job.id, {'channel': job.channel, 'text': job.text, 'status': job.status, 'done': job.done.is_set()})
+
+
+def _run(job: ClipJob, has_delay: bool) -> None:
+    try:
+        job.text, job.status = make_clip(job.channel, has_delay)
+    finally:
+        job.done.set()
+        _publish(job)
+
+
+def make_clip_coalesced(channel_login: str, has_delay: bool = False) -> tuple[str, int]:
+    """Como `make_clip()`, pero los pedidos casi simultáneos del canal reciben el mismo clip."""
+    job, new = _job_for(channel_login, has_delay)
+    if new:
+        _run(job, has_delay)
+    else:
+        job.done.wait()
+    return job.text, job.status
+
+
+def submit_clip(channel_login: str, has_delay: bool = False) -> ClipJob:
+    """Encola la creación del clip (o se suma a uno reciente del canal) y devuelve el job de inmediato."""
+    job, new = _job_for(channel_login, has_delay)
+    if new:
+        _publish(job)
+        # `submit` copia el contexto: el job conserva la prioridad alta de la petición (common/governor.py).
+        submit(_pool, _run, job, has_delay)
+    return job
+
+
+def _remote_job(job_id: str) -> Optional[ClipJob]:
+    data = _shared.get(job_id) if _shared is not None else None
+    if not data:
+        return None
+    job = ClipJob(data['channel'], job_id)
+    job.text, job.status = data['text'], data['status']
+    if data['done']:
+        job.done.set()
+    return job
+
+
+def get_job(job_id: str) -> Optional[ClipJob]:
+    """Job de este worker o, con caché compartida, el publicado por otro worker."""
+    return _jobs.get(job_id) or _remote_job(job_id)
+
+
+def wait_job(job: ClipJob, timeout: float) -> ClipJob:
+    """Espera hasta `timeout` a que termine; un job de otro worker se consulta cada 0.25 s."""
+    if job.done.is_set() or _jobs.get(job.id) is job:
+        job.done.wait(timeout)
+        return job
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        time.sleep(min(0.25, max(0.0, end - time.monotonic())))
+        fresh = _remote_job(job.id)
+        if fresh is not None and fresh.done.is_set():
+            return fresh
+    return job
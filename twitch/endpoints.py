@@ -1,21 +1,34 @@
-from flask import request, Response, url_for
+from flask import request, Response, url_for, jsonify
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from .config import CHANNEL_LOGIN, CLIENT_ID, CLIENT_SECRET, USER_ACCESS_TOKEN, ENDPOINT_PASSWORD
+import os
+import hmac
+import time
+import threading
 import urllib.parse
 import requests
 import re
 import logging
-import time
-from common.response import text_response
-from common.http import get_session
-from common.cache import SimpleTTLCache
-from twitch.api import get_user_id, get_follow_info, validate_token, create_clip, get_clip_url
-
-_session = get_session()
-_cache = SimpleTTLCache(default_ttl=15)
-
-
-
+from common.response import text_response, cached_text_response, stale_text_response
+from common.breaker import STALE_FALLBACK_TTL
+from common.deadline import submit
+from common.cache import make_cache
+from twitch.api import get_app_token, get_user_ids, get_follow_info, USERS_BATCH
+from twitch.validation import validate_token_cached, validator
+from twitch.followers import get_store
+from twitch.clips import make_clip_coalesced, submit_clip, get_job, wait_job, ASYNC_ENABLED
+
+_cache = make_cache("twitch", default_ttl=15)
+# Últimas respuestas buenas (fallback con el circuito abierto): caché aparte para que
+# muchos `?user=` distintos no desplacen las entradas vivas de `_cache`.
+LAST_GOOD_MAX = int(os.environ.get("TWITCH_LAST_GOOD_MAX", "2000"))
+_last_good = make_cache("twitch_last_good", default_ttl=STALE_FALLBACK_TTL, max_entries=LAST_GOOD_MAX)
+
+# Máximo de usuarios por petición a /twitch/followage/batch y consultas de follow en paralelo.
+BATCH_MAX = 100
+FANOUT_WORKERS = int(os.environ.get("TWITCH_FANOUT_WORKERS", "8"))
+_pool = ThreadPoolExecutor(max_workers=max(1, FANOUT_WORKERS), thread_name_prefix="twitch-fetch")
 
 
 def _humanize_duration(delta_seconds: float) -> str:
@@ -61,19 +74,26 @@ def followage():
         return text_response("Faltan TWITCH_CLIENT_ID y/o TWITCH_CLIENT_SECRET.", 500)
 
     cache_key = f"followage:{user_login}:{channel_login}"
-    cached = _cache.get(cache_key)
-    if cached:
-        return text_response(cached)
+    cached = _cache.get_with_ttl(cache_key)
+    if cached and cached[0]:
+        return _followage_response(*cached)
+
+    local = _followage_local(user_login, channel_login)
+    if local:
+        _remember(cache_key, local)
+        return _followage_response(local, _cache.default_ttl)
 
     try:
-        follower_id = get_user_id(user_login)
-        channel_id = get_user_id(channel_login)
+        # Una sola llamada a Helix /users (o ninguna si ambos están en el índice)
+        ids = get_user_ids([user_login, channel_login])
+        follower_id = ids.get(user_login)
+        channel_id = ids.get(channel_login)
     except requests.exceptions.HTTPError as e:
         logging.exception("HTTP error en followage get_user_id")
-        return text_response("Error al autenticar con Twitch (Client ID/Secret).", 500)
+        return _followage_stale(cache_key) or text_response("Error al autenticar con Twitch (Client ID/Secret).", 500)
     except requests.exceptions.RequestException:
         logging.exception("Error de red en followage get_user_id")
-        return text_response("No se pudo contactar a la API de Twitch.", 502)
+        return _followage_stale(cache_key) or text_response("No se pudo contactar a la API de Twitch.", 502)
     except Exception:
         logging.exception("Error inesperado en followage get_user_id")
         return text_response("Error inesperado al buscar usuarios en Twitch.", 500)
@@ -98,28 +118,178 @@ def followage():
                 msg = e.response.text[:200]
             except Exception:
                 msg = ""
-        return text_response(f"Error de Twitch ({status}): {msg}", 502)
+        return _followage_stale(cache_key) or text_response(f"Error de Twitch ({status}): {msg}", 502)
     except requests.exceptions.RequestException as e:
         logging.exception("Error de red en followage get_follow_info")
-        return text_response("No se pudo consultar el follow en Twitch.", 502)
+        return _followage_stale(cache_key) or text_response("No se pudo consultar el follow en Twitch.", 502)
     except Exception:
         logging.exception("Error inesperado en followage get_follow_info")
         return text_response("Error inesperado al consultar follow.", 500)
     if not info:
         return text_response(f"{user_login} no sigue a {channel_login}.")
 
-    followed_at_str = info.get("followed_at")
     try:
-        followed_at = datetime.fromisoformat(followed_at_str.replace("Z", "+00:00"))
+        result = _followage_text(user_login, channel_login, info.get("followed_at"))
     except Exception:
         return text_response("Error al interpretar fecha de follow.", 500)
+    _remember(cache_key, result)
+    return _followage_response(result, _cache.default_ttl)
+
+
+def _followage_response(text: str, ttl: float):
+    # El texto cambia poco dentro de un TTL: un CDN puede servirlo algo vencido mientras revalida.
+    return cached_text_response(text, ttl, _cache.default_ttl)
 
+
+def _remember(cache_key: str, text: str) -> None:
+    _cache.set(cache_key, text)
+    # Copia de larga duración para responder si Twitch cae (circuito abierto)
+    _last_good.set(cache_key, (text, time.time()))
+
+
+def _followage_stale(cache_key: str):
+    """Última respuesta buena de este followage marcada como vieja, o None."""
+    item = _last_good.get(cache_key)
+    if not item:
+        return None
+    text, saved_at = item
+    return stale_text_response(text, time.time() - saved_at)
+
+
+def _followage_text(user_login: str, channel_login: str, followed_at_str: str) -> str:
+    followed_at = datetime.fromisoformat(followed_at_str.replace("Z", "+00:00"))
     now = datetime.now(timezone.utc)
     delta = (now - followed_at).total_seconds()
     human = _humanize_duration(delta)
-    result = f"{user_login} sigue a {channel_login} desde hace {human}."
-    _cache.set(cache_key, result)
-    return text_response(result)
+    return f"{user_login} sigue a {channel_login} desde hace {human}."
+
+
+def _followage_local(user_login: str, channel_login: str) -> str | None:
+    """Respuesta desde el índice local de seguidores, o None si hay que consultar a Helix."""
+    store = get_store()
+    if store is None or channel_login != (CHANNEL_LOGIN or "").strip().lower():
+        return None
+    try:
+        channel_id = get_user_ids([channel_login]).get(channel_login)
+        if not channel_id:
+            return None
+        store.start(channel_id)
+        if not store.is_synced(channel_id):
+            return None
+        row = store.lookup(channel_id, login=user_login)
+        # Sin fila puede ser un follow reciente aún no sincronizado: se pregunta a Helix.
+        return _followage_text(user_login, channel_login, row["followed_at"]) if row else None
+    except Exception:
+        logging.warning("Índice local de seguidores no disponible", exc_info=True)
+        return None
+
+
+def followage_batch():
+    """
+    Followage de varios usuarios en una sola petición.
+
+    `?users=a,b,c` (o POST JSON `{"users": [...]}`), hasta BATCH_MAX logins.
+    Resuelve todos los IDs en una llamada a Helix /users, consulta los follows en
+    paralelo y devuelve JSON con un resultado por usuario (`status`: ok,
+    not_following, not_found, invalid o error).
+    """
+    raw = request.args.get("users", "")
+    channel_login = request.args.get("channel", "").strip().lower() or CHANNEL_LOGIN.lower()
+    if request.method == "POST":
+        body = request.get_json(silent=True)
+        if body is None:
+            body = {}
+        if not isinstance(body, dict):
+            return text_response('El cuerpo debe ser un objeto JSON: {"users": [...], "channel": "..."}', 400)
+        raw = body.get("users", raw)
+        channel = body.get("channel")
+        if channel is not None and not isinstance(channel, str):
+            return text_response("'channel' debe ser texto.", 400)
+        channel_login = (channel or "").strip().lower() or channel_login
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    elif not isinstance(raw, list):
+        return text_response("'users' debe ser una lista de logins o texto separado por comas.", 400)
+
+    # Deduplica conservando el orden y corta apenas se pasa de BATCH_MAX.
+    seen: dict[str, None] = {}
+    for login in raw:
+        login = (str(login) if login is not None else "").strip().lower()
+        if login and login not in seen:
+            seen[login] = None
+            if len(seen) > BATCH_MAX:
+                return text_response(f"Máximo {BATCH_MAX} usuarios por petición.", 400)
+    logins = list(seen)
+
+    if not logins:
+        return text_response("Debes proporcionar ?users=<login1>,<login2>,...", 400)
+    if not channel_login:
+        return text_response("Falta configurar TWITCH_CHANNEL_LOGIN.", 500)
+    if not re.fullmatch(r"^[A-Za-z0-9_]{1,32}$", channel_login):
+        return text_response("'channel' inválido. Usa A–Z, 0–9 y _.", 400)
+    if not CLIENT_ID or not CLIENT_SECRET:
+        return text_response("Faltan TWITCH_CLIENT_ID y/o TWITCH_CLIENT_SECRET.", 500)
+
+    results: dict[str, dict] = {}
+    pending: list[str] = []
+    for login in logins:
+        if not re.fullmatch(r"^[A-Za-z0-9_]{1,32}$", login):
+            results[login] = {"status": "invalid", "text": "'user' inválido. Usa A–Z, 0–9 y _."}
+            continue
+        cached = _cache.get(f"followage:{login}:{channel_login}") or _followage_local(login, channel_login)
+        if cached:
+            results[login] = {"status": "ok", "text": cached}
+        else:
+            pending.append(login)
+
+    if pending:
+        try:
+            if len(pending) < USERS_BATCH:
+                ids = get_user_ids(pending + [channel_login])
+            else:
+                # 100 logins llenan la llamada a Helix /users: el canal (casi siempre en caché) va aparte y primero.
+                ids = get_user_ids([channel_login])
+                if ids.get(channel_login):
+                    ids.update(get_user_ids(pending))
+        except requests.exceptions.RequestException:
+            logging.exception("Error en followage batch get_user_ids")
+            return text_response("No se pudo contactar a la API de Twitch.", 502)
+        channel_id = ids.get(channel_login)
+        if not channel_id:
+            return text_response(f"No encontré el canal '{channel_login}'.", 404)
+
+        futures = {}
+        for login in pending:
+            follower_id = ids.get(login)
+            if not follower_id:
+                results[login] = {"status": "not_found", "text": f"No encontré al usuario '{login}'."}
+            else:
+                futures[login] = submit(_pool, get_follow_info, follower_id, channel_id)
+
+        for login, fut in futures.items():
+            try:
+                info = fut.result()
+                if not info:
+                    results[login] = {"status": "not_following", "text": f"{login} no sigue a {channel_login}."}
+                    continue
+                text = _followage_text(login, channel_login, info.get("followed_at"))
+                _remember(f"followage:{login}:{channel_login}", text)
+                results[login] = {"status": "ok", "text": text, "followed_at": info.get("followed_at")}
+            except RuntimeError as e:
+                results[login] = {"status": "error", "text": str(e)}
+            except requests.exceptions.HTTPError as e:
+                status = getattr(e.response, "status_code", 500)
+                results[login] = {"status": "error", "text": f"Error de Twitch ({status})"}
+            except requests.exceptions.RequestException:
+                results[login] = {"status": "error", "text": "No se pudo consultar el follow en Twitch."}
+            except Exception:
+                logging.exception("Error inesperado en followage batch")
+                results[login] = {"status": "error", "text": "Error inesperado al consultar follow."}
+
+    return jsonify({
+        "channel": channel_login,
+        "results": [dict(user=login, **results[login]) for login in logins],
+    })
 
 
 def token():
@@ -251,13 +421,41 @@ def token():
         return text_response("Error inesperado al generar token.", 500)
 
 
+# `?refresh=1` en /twitch/status: como mucho una revalidación forzada por intervalo.
+STATUS_REFRESH_MIN_INTERVAL = float(os.environ.get("TWITCH_STATUS_REFRESH_MIN_INTERVAL", "60"))
+_last_forced_refresh = 0.0
+_forced_refresh_lock = threading.Lock()
+
+
+def _forced_refresh_allowed() -> bool:
+    """`?refresh=1` sólo cuenta con la contraseña del endpoint (si hay una) y respetando el intervalo."""
+    global _last_forced_refresh
+    if (request.args.get("refresh") or "").strip().lower() not in ("1", "true", "yes"):
+        return False
+    expected = (ENDPOINT_PASSWORD or "").strip()
+    given = (request.headers.get("X-Endpoint-Password") or request.args.get("password") or "").strip()
+    if expected and not hmac.compare_digest(given.encode(), expected.encode()):
+        return False
+    with _forced_refresh_lock:
+        now = time.monotonic()
+        if _last_forced_refresh and now - _last_forced_refresh < STATUS_REFRESH_MIN_INTERVAL:
+            return False
+        _last_forced_refresh = now
+        return True
+
+
 def status():
     """
     Muestra información de configuración y validación del token de aplicación:
     - Canal configurado
     - Estado de validez de tokens (sin mostrar datos sensibles)
     - Presencia de scopes requeridos
+
+    Las validaciones salen de memoria (ver `twitch.validation`); `?refresh=1` fuerza revalidar
+    (con la contraseña del endpoint si está configurada, y una vez por intervalo).
     """
+    force = _forced_refresh_allowed()
+    validator.start(_tokens_to_validate)
     lines = []
     lines.append("Estado de Twitch")
     lines.append("")
@@ -275,7 +473,7 @@ def status():
     else:
         try:
             tok = get_app_token()
-            validate_token(tok)
+            validate_token_cached(tok, force=force)
             lines.append("Token de app: válido")
         except requests.exceptions.HTTPError as e:
             status = getattr(e.response, "status_code", 500)
@@ -292,7 +490,7 @@ def status():
         lines.append("Token usuario: (no configurado) -> define TWITCH_USER_TOKEN")
     else:
         try:
-            info = validate_token(user_tok)
+            info = validate_token_cached(user_tok, force=force)
             scopes = info.get("scopes", [])
             has_followers = "moderator:read:followers" in scopes
             lines.append("")
@@ -313,6 +511,19 @@ def status():
     return text_response(body)
 
 
+def _tokens_to_validate() -> list[str]:
+    tokens = []
+    if CLIENT_ID and CLIENT_SECRET:
+        try:
+            tokens.append(get_app_token())
+        except Exception:
+            logging.warning("No se pudo obtener el token de app para validarlo", exc_info=True)
+    user_tok = (USER_ACCESS_TOKEN or "").strip()
+    if user_tok:
+        tokens.append(user_tok)
+    return [t for t in tokens if t]
+
+
 def oauth_callback():
     """
     Página de callback para flujo OAuth implícito de Twitch.
@@ -591,52 +802,33 @@ def clip():
 
     has_delay = (request.args.get("has_delay") or "").strip().lower() in ("1", "true", "yes")
 
-    try:
-        clip_obj = create_clip(channel_login, has_delay=has_delay)
-    except RuntimeError as e:
-        return text_response(str(e), 500)
-    except requests.exceptions.HTTPError as e:
-        status = getattr(e.response, "status_code", 500)
-        msg = ""
-        try:
-            body = e.response.json()
-            msg = body.get("message") or body.get("error") or ""
-        except Exception:
-            try:
-                msg = e.response.text[:200]
-            except Exception:
-                msg = ""
-        return text_response(f"Error de Twitch ({status}): {msg}", 502)
-    except requests.exceptions.RequestException:
-        return text_response("No se pudo contactar a la API de Twitch.", 502)
-    except Exception:
-        logging.exception("Error inesperado en /twitch/clip")
-        return text_response("Error inesperado al crear clip.", 500)
+    # Sin caché compartida y con varios workers el resultado no se podría consultar: se responde síncrono.
+    if ASYNC_ENABLED and (request.args.get("async") or "").strip().lower() in ("1", "true", "yes"):
+        # Devuelve al instante; el clip se crea en segundo plano y se consulta en /twitch/clip/<job>
+        job = submit_clip(channel_login, has_delay=has_delay)
+        status_url = url_for('clip_result', job_id=job.id, _external=True)
+        resp = text_response(f"Creando clip... resultado en {status_url}", 202)
+        resp.headers['Location'] = status_url
+        return resp
+
+    text, status_code = make_clip_coalesced(channel_login, has_delay=has_delay)
+    return text_response(text, status_code)
 
-    if not clip_obj:
-        return text_response("No se pudo crear el clip (¿canal no está en vivo?).", 502)
 
-    clip_id = clip_obj.get("id") or ""
-    edit_url = (clip_obj.get("edit_url") or "").strip()
-    clip_url = ""
+def clip_result(job_id: str):
+    """
+    Resultado de un clip asíncrono. `?wait=<s>` (máx. 10) espera a que termine
+    antes de responder (long-poll); mientras siga en proceso responde 202.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return text_response("Job de clip no encontrado o expirado.", 404)
     try:
-        for _ in range(3):
-            u = (get_clip_url(clip_id) or "").strip()
-            if u:
-                clip_url = u
-                break
-            time.sleep(0.4)
-    except Exception:
-        pass
-    if not clip_url:
-        clip_url = edit_url
-    if clip_url.endswith("/edit"):
-        clip_url = clip_url[:-5]
-    if "/clip/" in clip_url:
-        try:
-            slug = clip_url.rsplit("/clip/", 1)[1].split("/")[0]
-            if slug:
-                clip_url = f"https://clips.twitch.tv/{slug}"
-        except Exception:
-            pass
-    return text_response(clip_url or "")
+        wait = min(max(float(request.args.get("wait") or 0), 0.0), 10.0)
+    except ValueError:
+        wait = 0.0
+    if wait and not job.done.is_set():
+        job = wait_job(job, wait)
+    if not job.done.is_set():
+        return text_response("Clip en proceso...", 202)
+    return text_response(job.text, job.status)
@@ -0,0 +1,200 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional
+from common.paths import private_file
+from .api import get_followers_page
+
+# Índice local de seguidores sincronizado desde Helix (opcional).
+FOLLOWER_SYNC = (os.environ.get("TWITCH_FOLLOWER_SYNC") or "").strip().lower() in ("1", "true", "yes")
+# Por defecto en el directorio privado del usuario (ver common/paths.py).
+FOLLOWERS_DB = os.environ.get("TWITCH_FOLLOWERS_DB") or private_file("followers.sqlite3")
+# Cada cuánto se traen los follows nuevos y cada cuánto se recorre la lista completa
+# (la completa es la única que detecta unfollows).
+SYNC_INTERVAL = int(os.environ.get("TWITCH_FOLLOWER_SYNC_INTERVAL", "300"))
+FULL_SYNC_INTERVAL = int(os.environ.get("TWITCH_FOLLOWER_FULL_SYNC_INTERVAL", "86400"))
+if FOLLOWER_SYNC and not FOLLOWERS_DB:
+    logging.warning("No hay un directorio privado seguro para el índice de seguidores; define TWITCH_FOLLOWERS_DB")
+    FOLLOWER_SYNC = False
+# Con varios workers sólo uno sincroniza: el que tiene el lease (se renueva en cada vuelta).
+SYNC_LEASE_SECONDS = max(3 * SYNC_INTERVAL, 900)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS followers (
+    broadcaster_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    user_login TEXT NOT NULL,
+    followed_at TEXT NOT NULL,
+    PRIMARY KEY (broadcaster_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS followers_login ON followers (broadcaster_id, user_login);
+CREATE TABLE IF NOT EXISTS sync_state (
+    broadcaster_id TEXT PRIMARY KEY,
+    last_full_sync REAL NOT NULL,
+    last_sync REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_lease (
+    broadcaster_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+# Toma o renueva el lease si está libre, vencido o ya es nuestro (atómico).
+_LEASE = (
+    "INSERT INTO sync_lease (broadcaster_id, owner, expires) VALUES (?1, ?2, ?3 + ?4)"
+    " ON CONFLICT(broadcaster_id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires"
+    " WHERE sync_lease.owner = excluded.owner OR sync_lease.expires <= ?3"
+)
+
+
+class FollowerStore:
+    """
+    Seguidores de un canal en SQLite, indexados por user_id y por login.
+
+    - `full_sync()` recorre todas las páginas con cursores y reemplaza la lista.
+    - `incremental_sync()` sólo trae páginas hasta encontrar follows ya conocidos.
+    - `lookup()` devuelve {'user_id', 'user_login', 'followed_at'} o None; un None
+      no significa "no sigue" (puede ser un follow aún no sincronizado).
+    - Los workers que comparten el archivo eligen un único sincronizador con un lease
+      en la tabla `sync_lease`; el resto sólo lee.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._thread: Optional[threading.Thread] = None
+        self._channel_id: Optional[str] = None
+        self._owner = f"{os.uname().nodename}:{os.getpid()}:{id(self):x}"
+
+    def is_synced(self, channel_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM sync_state WHERE broadcaster_id = ?", (channel_id,)
+            ).fetchone()
+        return row is not None
+
+    def lookup(self, channel_id: str, user_id: Optional[str] = None, login: Optional[str] = None) -> Optional[dict]:
+        if user_id:
+            sql, arg = "user_id = ?", user_id
+        elif login:
+            sql, arg = "user_login = ?", login.lower()
+        else:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT user_id, user_login, followed_at FROM followers WHERE broadcaster_id = ? AND {sql}",
+                (channel_id, arg),
+            ).fetchone()
+        if not row:
+            return None
+        return {"user_id": row[0], "user_login": row[1], "followed_at": row[2]}
+
+    def full_sync(self, channel_id: str) -> int:
+        rows: list[tuple] = []
+        cursor = None
+        while True:
+            items, cursor = get_followers_page(channel_id, after=cursor)
+            rows.extend(self._rows(channel_id, items))
+            if not cursor or not items:
+                break
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM followers WHERE broadcaster_id = ?", (channel_id,))
+                self._conn.executemany("INSERT OR REPLACE INTO followers VALUES (?, ?, ?, ?)", rows)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)", (channel_id, now, now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        logging.info("Sincronización completa de seguidores: %s", len(rows))
+        return len(rows)
+
+    def incremental_sync(self, channel_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(followed_at) FROM followers WHERE broadcaster_id = ?", (channel_id,)
+            ).fetchone()
+        newest = row[0] if row else None
+        rows: list[tuple] = []
+        cursor = None
+        while True:
+            items, cursor = get_followers_page(channel_id, after=cursor)
+            fresh = [it for it in items if not newest or (it.get("followed_at") or "") > newest]
+            rows.extend(self._rows(channel_id, fresh))
+            # Las páginas vienen de más reciente a más antiguo: al ver uno conocido se termina.
+            if len(fresh) < len(items) or not cursor or not items:
+                break
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO followers VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute(
+                "UPDATE sync_state SET last_sync = ? WHERE broadcaster_id = ?", (time.time(), channel_id)
+            )
+        return len(rows)
+
+    def start(self, channel_id: str) -> None:
+        """Arranca (una vez) el hilo que mantiene sincronizado `channel_id`."""
+        self._channel_id = channel_id
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="twitch-follower-sync", daemon=True)
+                self._thread.start()
+
+    def _hold_lease(self, channel_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute(_LEASE, (channel_id, self._owner, time.time(), SYNC_LEASE_SECONDS))
+            return cur.rowcount > 0
+
+    def _run(self) -> None:
+        while True:
+            channel_id = self._channel_id
+            try:
+                if not self._hold_lease(channel_id):
+                    # Otro worker sincroniza este canal; aquí sólo se lee el índice.
+                    time.sleep(SYNC_INTERVAL)
+                    continue
+                with self._lock:
+                    row = self._conn.execute(
+                        "SELECT last_full_sync FROM sync_state WHERE broadcaster_id = ?", (channel_id,)
+                    ).fetchone()
+                if not row or time.time() - row[0] >= FULL_SYNC_INTERVAL:
+                    self.full_sync(channel_id)
+                else:
+                    self.incremental_sync(channel_id)
+            except Exception:
+                logging.exception("Error sincronizando seguidores de Twitch")
+            time.sleep(SYNC_INTERVAL)
+
+    @staticmethod
+    def _rows(channel_id: str, items: list[dict]) -> list[tuple]:
+        return [
+            (channel_id, it.get("user_id"), (it.get("user_login") or "").lower(), it.get("followed_at"))
+            for it in items
+            if it.get("user_id") and it.get("followed_at")
+        ]
+
+
+_store: Optional[FollowerStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[FollowerStore]:
+    """Store compartido si TWITCH_FOLLOWER_SYNC está activo; None si no."""
+    global _store
+    if not FOLLOWER_SYNC:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FollowerStore(FOLLOWERS_DB)
+    return _store
@@ -0,0 +1,79 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from typing import Optional, Callable
+import requests
+from common.cache import SimpleTTLCache
+from .api import validate_token
+
+# Twitch pide validar los tokens cada hora; el resultado (scopes, expires_in) casi no cambia.
+VALIDATE_INTERVAL = int(os.environ.get("TWITCH_VALIDATE_INTERVAL", "3600"))
+# Un token rechazado (401) se recuerda poco tiempo para no martillar id.twitch.tv.
+VALIDATE_NEGATIVE_TTL = int(os.environ.get("TWITCH_VALIDATE_NEGATIVE_TTL", "300"))
+# Guarda (info, error) por hash del token; nunca el token en claro.
+_validations = SimpleTTLCache(default_ttl=VALIDATE_INTERVAL, max_entries=64)
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def validate_token_cached(token: str, force: bool = False) -> dict:
+    """
+    Como `validate_token()`, pero reutiliza el último resultado.
+
+    El resultado vive hasta el próximo ciclo de validación o hasta que el token
+    expire (`expires_in`), lo que ocurra antes. `force=True` vuelve a consultar.
+    Los rechazos HTTP se recuerdan `VALIDATE_NEGATIVE_TTL` segundos y se relanzan.
+    """
+    key = _token_key(token)
+    if not force:
+        cached = _validations.get(key)
+        if cached is not None:
+            info, error = cached
+            if error is not None:
+                raise error
+            return info
+    try:
+        info = validate_token(token)
+    except requests.exceptions.HTTPError as e:
+        _validations.set(key, (None, e), ttl=VALIDATE_NEGATIVE_TTL)
+        raise
+    expires_in = int(info.get("expires_in") or 0)
+    # expires_in == 0: el token no expira (p. ej. algunos tokens de usuario)
+    ttl = min(VALIDATE_INTERVAL, expires_in) if expires_in > 0 else VALIDATE_INTERVAL
+    _validations.set(key, (info, None), ttl=max(1, ttl))
+    return info
+
+
+class _Validator:
+    """Hilo único que revalida los tokens configurados cada `VALIDATE_INTERVAL` segundos."""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._tokens: Callable[[], list[str]] = lambda: []
+
+    def start(self, tokens: Callable[[], list[str]]) -> None:
+        self._tokens = tokens
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="twitch-validator", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            # Un poco antes de que venza la caché, para que /twitch/status nunca valide en línea.
+            time.sleep(max(60, VALIDATE_INTERVAL - 60))
+            for tok in self._tokens():
+                try:
+                    validate_token_cached(tok, force=True)
+                except Exception:
+                    logging.warning("Validación periódica de token de Twitch fallida", exc_info=True)
+
+
+validator = _Validator()
@@ -0,0 +1,179 @@
+import os
+import time
+import logging
+import urllib.parse
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any
+from .config import NOMBRE, TAG, REGION, API_KEY
+from common.http import get_session, timeouts
+from common.deadline import submit
+from common.cache import make_cache, json_type
+from common.breaker import STALE_FALLBACK_TTL
+from common import profiling
+
+_session = get_session()
+
+CACHE_TTL = int(os.environ.get("VALORANT_CACHE_TTL", "15"))
+# Segundos tras el TTL en los que se sirve el snapshot viejo mientras se refresca.
+STALE_GRACE = int(os.environ.get("VALORANT_STALE_GRACE", "60"))
+_cache = make_cache("valorant", default_ttl=CACHE_TTL)
+
+# Pool acotado para lanzar mmr y matches en paralelo (latencia = la más lenta de las dos).
+FANOUT_WORKERS = int(os.environ.get("VALORANT_FANOUT_WORKERS", "4"))
+_pool = ThreadPoolExecutor(max_workers=max(2, FANOUT_WORKERS), thread_name_prefix="valorant-fetch")
+
+BASE_URL = "https://api.henrikdev.xyz/valorant"
+
+
+def _quoted(s: str) -> str:
+    return urllib.parse.quote(s or "", safe='')
+
+
+@json_type
+class Snapshot:
+    """
+    Foto de un jugador: `current_data` de v2/mmr y sus partidas recientes ya parseadas.
+
+    `matches` es None si la consulta de partidas falló (`matches_error` guarda el motivo);
+    así /valorant/rango puede responder sin agente como antes.
+    """
+    __slots__ = ('mmr', 'matches', 'matches_error', 'fetched_at')
+
+    def __init__(
+        self,
+        mmr: Optional[dict],
+        matches: Optional[list[dict]],
+        matches_error: Optional[Exception] = None,
+    ):
+        self.mmr = mmr
+        self.matches = matches
+        self.matches_error = matches_error
+        self.fetched_at = time.time()
+
+    def to_json(self) -> dict:
+        err = self.matches_error
+        return {
+            'mmr': self.mmr,
+            'matches': self.matches,
+            'matches_error': None if err is None else [type(err).__name__, str(err)],
+            'fetched_at': self.fetched_at,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Snapshot":
+        err = None
+        if data.get('matches_error'):
+            # Se conserva el tipo si es una excepción de requests (el endpoint responde según el tipo).
+            name, msg = data['matches_error']
+            exc_type = getattr(requests.exceptions, name, None)
+            if not (isinstance(exc_type, type) and issubclass(exc_type, Exception)):
+                exc_type = RuntimeError
+            err = exc_type(msg)
+        snap = cls(data.get('mmr'), data.get('matches'), err)
+        snap.fetched_at = data.get('fetched_at', snap.fetched_at)
+        return snap
+
+    def ultima_partida(self) -> Optional[dict]:
+        return self.matches[0] if self.matches else None
+
+    def ultima_competitiva(self) -> Optional[dict]:
+        for partida in self.matches or []:
+            if (partida.get('mode') or '').lower() == 'competitive':
+                return partida
+        return None
+
+
+def _parse_match(partida: dict) -> dict:
+    """Reduce una partida de v3/matches a los campos que usan los endpoints."""
+    metadata = partida.get('metadata', {})
+    parsed: dict[str, Any] = {
+        'mode': metadata.get('mode', ''),
+        'map': metadata.get('map'),
+        'character': None,
+        'kills': 0,
+        'deaths': 0,
+        'assists': 0,
+        'won': False,
+    }
+    for p in partida.get('players', {}).get('all_players', []):
+        if p.get('name', '').lower() == NOMBRE.lower() and p.get('tag', '').lower() == TAG.lower():
+            stats = p.get('stats', {})
+            parsed['character'] = p.get('character')
+            parsed['kills'] = stats.get('kills', 0)
+            parsed['deaths'] = stats.get('deaths', 0)
+            parsed['assists'] = stats.get('assists', 0)
+            team = p.get('team')
+            if team:
+                parsed['won'] = partida.get('teams', {}).get(team.lower(), {}).get('has_won', False)
+            break
+    return parsed
+
+
+def fetch_mmr() -> Optional[dict]:
+    """GET v2/mmr → `current_data` (o None si la API no trae datos actuales)."""
+    url = f"{BASE_URL}/v2/mmr/{REGION}/{_quoted(NOMBRE)}/{_quoted(TAG)}?api_key={API_KEY}"
+    res = _session.get(url, timeout=timeouts())
+    res.raise_for_status()
+    return res.json().get('data', {}).get('current_data') or None
+
+
+def fetch_matches() -> list[dict]:
+    """GET v3/matches → lista de partidas parseadas (vacía si no hay recientes)."""
+    url = f"{BASE_URL}/v3/matches/{REGION}/{_quoted(NOMBRE)}/{_quoted(TAG)}?api_key={API_KEY}"
+    res = _session.get(url, timeout=timeouts())
+    res.raise_for_status()
+    # La respuesta de v3/matches es grande: su parseo aparece como span en el perfilado.
+    with profiling.span("parse", "v3/matches"):
+        data = res.json()
+        if data.get('status') != 200 or not data.get('data'):
+            return []
+        return [_parse_match(p) for p in data['data']]
+
+
+def _cargar_snapshot() -> Snapshot:
+    # Ambas consultas son independientes: se lanzan a la vez y cada error se aísla.
+    # `submit` propaga el deadline de la petición a los hilos del pool.
+    mmr_fut = submit(_pool, fetch_mmr)
+    matches_fut = submit(_pool, fetch_matches)
+    mmr = mmr_fut.result()
+    try:
+        matches, error = matches_fut.result(), None
+    except Exception as e:
+        logging.exception("Error al obtener partidas recientes")
+        # Copia sin response/traceback: el snapshot puede ir a una caché compartida
+        try:
+            error = type(e)(str(e))
+        except Exception:
+            error = RuntimeError(str(e))
+        matches = None
+    snap = Snapshot(mmr, matches, error)
+    if matches is not None:
+        # Copia de larga duración para responder si HenrikDev cae (circuito abierto)
+        _cache.set(_last_good_key(), snap, ttl=STALE_FALLBACK_TTL)
+    return snap
+
+
+def snapshot_key() -> str:
+    return f"snapshot:{REGION}:{_quoted(NOMBRE)}:{_quoted(TAG)}"
+
+
+def _last_good_key() -> str:
+    return "last_good:" + snapshot_key()
+
+
+def last_good_snapshot() -> Optional[Snapshot]:
+    """Último snapshot completo obtenido, aunque ya haya vencido (None si no hay)."""
+    return _cache.get(_last_good_key())
+
+
+def get_snapshot() -> Snapshot:
+    """Snapshot del jugador configurado: una consulta a mmr y otra a matches por TTL."""
+    return _cache.get_or_load(snapshot_key(), _cargar_snapshot, grace=STALE_GRACE)
+
+
+def refresh_snapshot() -> Snapshot:
+    """Fuerza una consulta nueva y deja el snapshot en caché (lo usa el poller)."""
+    snap = _cargar_snapshot()
+    _cache.set(snapshot_key(), snap, grace=STALE_GRACE)
+    return snap
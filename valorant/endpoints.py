@@ -1,21 +1,12 @@
-import os
-import requests
 import time
-import urllib.parse
+import requests
 import logging
-from .config import NOMBRE, TAG, REGION, API_KEY
+from .config import API_KEY
 from .rangos_es import Rangos_ES
-from common.response import text_response
-from common.http import get_session
-from common.cache import SimpleTTLCache
-
-_session = get_session()
+from .data import Snapshot, get_snapshot, last_good_snapshot, CACHE_TTL, STALE_GRACE
+from .poller import Poller, POLLER_ENABLED
+from common.response import text_response, cached_text_response, stale_text_response
 
-CACHE_TTL = int(os.environ.get("VALORANT_CACHE_TTL", "15"))
-_cache = SimpleTTLCache(default_ttl=CACHE_TTL)
-
-def _quoted(s: str) -> str:
-    return urllib.parse.quote(s or "", safe='')
 
 def _format_delta(delta):
     if isinstance(delta, int):
@@ -27,161 +18,128 @@ def _format_delta(delta):
             return "no cambié de puntos"
     return "cambio de puntos desconocido"
 
+def _respuesta_snapshot(texto: str, snap: Snapshot):
+    """Texto cacheable mientras el snapshot siga fresco en la caché del servidor."""
+    edad = max(0.0, time.time() - snap.fetched_at)
+    stale = CACHE_TTL + STALE_GRACE - max(edad, CACHE_TTL)
+    return cached_text_response(texto, CACHE_TTL - edad, stale, last_modified=snap.fetched_at)
+
+
+def _respuesta_poller(name: str):
+    """Texto pre-renderizado cacheable hasta el próximo refresco del poller, o None."""
+    item = _poller.leer_con_fecha(name)
+    if not item:
+        return None
+    texto, fetched_at, restante = item
+    return cached_text_response(texto, restante, _poller.interval, last_modified=fetched_at)
+
+def _respuesta_vieja(render):
+    """Con HenrikDev caído: el texto del último snapshot bueno marcado como viejo, o None."""
+    snap = last_good_snapshot()
+    if snap is None:
+        return None
+    try:
+        texto = render(snap)
+    except Exception:
+        return None
+    return stale_text_response(texto, time.time() - snap.fetched_at)
+
 # Cambio de rango.
 def rango():
     """Endpoint de rango según tu implementación original usando v2/mmr y current_data."""
     if not (API_KEY or "").strip():
         return text_response("Falta API_KEY.", 500)
 
-    name_q = _quoted(NOMBRE)
-    tag_q = _quoted(TAG)
-    url = (
-        f"https://api.henrikdev.xyz/valorant/v2/mmr/"
-        f"{REGION}/{name_q}/{tag_q}?api_key={API_KEY}"
-    )
-
-    cache_key = f"rango:{REGION}:{name_q}:{tag_q}"
-    cached = _cache.get(cache_key)
-    if cached:
-        return text_response(cached)
-
+    if _poller is not None:
+        resp = _respuesta_poller('rango')
+        if resp is not None:
+            return resp
     try:
-        res = _session.get(url, timeout=10)
-        res.raise_for_status()
-        data = res.json()
-
-        current_data = data.get('data', {}).get('current_data')
-        if not current_data:
-            return text_response("No hay datos actuales disponibles.")
-
-        rango_en = current_data.get('currenttierpatched', 'Desconocido')
-        rango_es = Rangos_ES.get(rango_en, rango_en)
-        puntos = current_data.get('ranking_in_tier', 'Desconocido')
-        delta_txt = _format_delta(current_data.get('mmr_change_to_last_game'))
-
-        ultimo_agente = obtener_ultimo_agente()
-
-        if ultimo_agente:
-            respuesta = (
-                f"🎀💕 actualmente estoy en {rango_es} con {puntos} puntos 🤗✨, "
-                f"mi última partida fue con {ultimo_agente} y {delta_txt}"
-            )
-        else:
-            respuesta = (
-                f"🎀💕 actualmente estoy en {rango_es} con {puntos} puntos 🤗✨, "
-                f"mi última partida: {delta_txt}"
-            )
-        _cache.set(cache_key, respuesta)
-        return text_response(respuesta)
+        snap = get_snapshot()
+        return _respuesta_snapshot(_texto_rango(snap), snap)
     except requests.exceptions.HTTPError:
         logging.exception("HTTP error en /valorant/rango")
-        return text_response("Servicio de Valorant devolvió error.", 502)
+        return _respuesta_vieja(_texto_rango) or text_response("Servicio de Valorant devolvió error.", 502)
     except requests.exceptions.RequestException:
         logging.exception("Error de red en /valorant/rango")
-        return text_response("No se pudo contactar a la API de Valorant.", 502)
+        return _respuesta_vieja(_texto_rango) or text_response("No se pudo contactar a la API de Valorant.", 502)
     except Exception:
         logging.exception("Error inesperado en /valorant/rango")
         return text_response("Rango no disponible", 500)
 
 
-def obtener_ultimo_agente():
-    """Obtiene el último agente jugado por el usuario"""
-    try:
-        name_q = _quoted(NOMBRE)
-        tag_q = _quoted(TAG)
-        url = (
-            f"https://api.henrikdev.xyz/valorant/v3/matches/"
-            f"{REGION}/{name_q}/{tag_q}?api_key={API_KEY}"
-        )
-        res = _session.get(url, timeout=10)
-        res.raise_for_status()
-        data = res.json()
+def _texto_rango(snap: Snapshot) -> str:
+    """Arma el mensaje de /valorant/rango a partir del snapshot."""
+    current_data = snap.mmr
+    if not current_data:
+        return "No hay datos actuales disponibles."
 
-        if data.get('status') == 200 and data.get('data') and len(data['data']) > 0:
-            ultima_partida = data['data'][0]
+    rango_en = current_data.get('currenttierpatched', 'Desconocido')
+    rango_es = Rangos_ES.get(rango_en, rango_en)
+    puntos = current_data.get('ranking_in_tier', 'Desconocido')
+    delta_txt = _format_delta(current_data.get('mmr_change_to_last_game'))
 
-            for jugador in ultima_partida.get('players', {}).get('all_players', []):
-                if jugador.get('name', '').lower() == NOMBRE.lower() and jugador.get('tag', '').lower() == TAG.lower():
-                    return jugador.get('character')
+    ultimo_agente = obtener_ultimo_agente(snap)
+
+    if ultimo_agente:
+        return (
+            f"🎀💕 actualmente estoy en {rango_es} con {puntos} puntos 🤗✨, "
+            f"mi última partida fue con {ultimo_agente} y {delta_txt}"
+        )
+    return (
+        f"🎀💕 actualmente estoy en {rango_es} con {puntos} puntos 🤗✨, "
+        f"mi última partida: {delta_txt}"
+    )
 
-        return None
-    except requests.exceptions.RequestException:
-        logging.exception("Error de red al obtener último agente")
-        return None
-    except Exception:
-        logging.exception("Error inesperado al obtener último agente")
-        return None
 
-# Ultima ranked 
+def obtener_ultimo_agente(snap: Snapshot):
+    """Obtiene el último agente jugado por el usuario"""
+    partida = snap.ultima_partida()
+    return partida.get('character') if partida else None
+
+# Ultima ranked
 def ultima_ranked():
     """Devuelve detalles de la última partida competitiva (ranked). Si la última no es ranked, busca la más reciente que sí lo sea."""
+    if _poller is not None:
+        resp = _respuesta_poller('ultima_ranked')
+        if resp is not None:
+            return resp
     try:
-        name_q = _quoted(NOMBRE)
-        tag_q = _quoted(TAG)
-
-        cache_key = f"ultima_competitiva:{REGION}:{name_q}:{tag_q}"
-        cached = _cache.get(cache_key)
-        if cached:
-            return text_response(cached)
-
-        url = (
-            f"https://api.henrikdev.xyz/valorant/v3/matches/"
-            f"{REGION}/{name_q}/{tag_q}?api_key={API_KEY}"
-        )
-        res = _session.get(url, timeout=10)
-        res.raise_for_status()
-        data = res.json()
-
-        if data.get('status') != 200 or not data.get('data'):
-            return text_response("No hay partidas recientes")
-
-        # Buscar la última partida competitiva
-        match = None
-        for partida in data['data']:
-            if partida.get('metadata', {}).get('mode', '').lower() == 'competitive':
-                match = partida
-                break
-        if not match:
-            return text_response("No se encontró partida competitiva reciente")
-
-        mapa = match.get('metadata', {}).get('map')
-        personaje = "?"
-        k, d, a = 0, 0, 0
-        gano = False
-        team = None
-        for p in match.get('players', {}).get('all_players', []):
-            if p.get('name', '').lower() == NOMBRE.lower() and p.get('tag', '').lower() == TAG.lower():
-                personaje = p.get('character')
-                stats = p.get('stats', {})
-                k, d, a = stats.get('kills', 0), stats.get('deaths', 0), stats.get('assists', 0)
-                team = p.get('team')
-                break
-
-        if team:
-            gano = match.get('teams', {}).get(team.lower(), {}).get('has_won', False)
-
-        mmr_url = (
-            f"https://api.henrikdev.xyz/valorant/v2/mmr/"
-            f"{REGION}/{name_q}/{tag_q}?api_key={API_KEY}"
-        )
-        mmr_res = _session.get(mmr_url, timeout=10)
-        mmr_res.raise_for_status()
-        mmr_data = mmr_res.json().get('data', {}).get('current_data', {})
-        delta_txt = _format_delta(mmr_data.get('mmr_change_to_last_game'))
-
-        resultado_txt = "ganamos" if gano else "perdimos"
-        mensaje = (
-            f"🎀💕 Mi última ranked fue en {mapa} con {personaje}, mi KDA fue {k}/{d}/{a}. "
-            f"{resultado_txt} y {delta_txt} 🤗✨"
-        )
-        _cache.set(cache_key, mensaje)
-        return text_response(mensaje)
+        snap = get_snapshot()
+        return _respuesta_snapshot(_texto_ultima_ranked(snap), snap)
     except requests.exceptions.HTTPError:
         logging.exception("HTTP error en /valorant/ultima-ranked")
-        return text_response("Servicio de Valorant devolvió error.", 502)
+        return _respuesta_vieja(_texto_ultima_ranked) or text_response("Servicio de Valorant devolvió error.", 502)
     except requests.exceptions.RequestException:
         logging.exception("Error de red en /valorant/ultima-ranked")
-        return text_response("No se pudo contactar a la API de Valorant.", 502)
+        return _respuesta_vieja(_texto_ultima_ranked) or text_response("No se pudo contactar a la API de Valorant.", 502)
     except Exception as e:
         logging.exception("Error inesperado en /valorant/ultima-ranked")
         return text_response("Error obteniendo última ranked", 500)
+
+
+def _texto_ultima_ranked(snap: Snapshot) -> str:
+    """Arma el mensaje de /valorant/ultima-ranked a partir del snapshot."""
+    if snap.matches is None:
+        # La consulta de partidas falló al construir el snapshot
+        raise snap.matches_error or RuntimeError("Partidas no disponibles")
+    if not snap.matches:
+        return "No hay partidas recientes"
+
+    match = snap.ultima_competitiva()
+    if not match:
+        return "No se encontró partida competitiva reciente"
+
+    personaje = match.get('character') or "?"
+    k, d, a = match['kills'], match['deaths'], match['assists']
+    delta_txt = _format_delta((snap.mmr or {}).get('mmr_change_to_last_game'))
+
+    resultado_txt = "ganamos" if match['won'] else "perdimos"
+    return (
+        f"🎀💕 Mi última ranked fue en {match['map']} con {personaje}, mi KDA fue {k}/{d}/{a}. "
+        f"{resultado_txt} y {delta_txt} 🤗✨"
+    )
+
+
+# Modo programado (VALORANT_POLLER=1): los endpoints leen los textos pre-renderizados.
+_poller = Poller({'rango': _texto_rango, 'ultima_ranked': _texto_ultima_ranked}) if POLLER_ENABLED else None
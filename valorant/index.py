@@ -28,7 +28,7 @@ def valorant_index():
   </head>
   <body>
     <div class=\"card\">
-      <h1><img src=\"{url_for('static', filename='valorant/valorant_Icon_purple.webp')}\" alt=\"Valorant\" loading=\"lazy\" style=\"height:32px;width:auto;vertical-align:middle;margin-right:8px;border-radius:6px;\" />Endpoints de Valorant</h1>
+      <h1><img src=\"{url_for('static', filename='valorant/valorant_Icon_purple.webp', size=32)}\" srcset=\"{url_for('static', filename='valorant/valorant_Icon_purple.webp', size=64)} 2x\" alt=\"Valorant\" loading=\"lazy\" style=\"height:32px;width:auto;vertical-align:middle;margin-right:8px;border-radius:6px;\" />Endpoints de Valorant</h1>
       <p>Listado de rutas disponibles y ejemplos de uso.</p>
       <div class=\"grid\">
         <div class=\"item\">
@@ -0,0 +1,90 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Optional
+from .data import Snapshot, refresh_snapshot
+
+# Modo programado: un hilo refresca el snapshot cada POLL_INTERVAL segundos y
+# deja los textos de los endpoints ya armados en memoria.
+POLLER_ENABLED = (os.environ.get("VALORANT_POLLER") or "").strip().lower() in ("1", "true", "yes")
+POLL_INTERVAL = int(os.environ.get("VALORANT_POLL_INTERVAL", "30"))
+# Si nadie pidió datos en este tiempo, el poller se pausa hasta la próxima petición.
+POLL_IDLE = int(os.environ.get("VALORANT_POLL_IDLE", "600"))
+
+
+class Poller:
+    """
+    Refresca el snapshot en segundo plano y pre-renderiza las respuestas.
+
+    `renderers` mapea un nombre ('rango', 'ultima_ranked') a la función que arma
+    el texto desde un Snapshot. `leer()` devuelve el texto pre-renderizado o None
+    si no hay uno reciente (el endpoint entonces usa el camino normal).
+    El hilo arranca con la primera lectura y se pausa tras `idle` segundos sin lecturas.
+    """
+
+    def __init__(self, renderers: dict[str, Callable[[Snapshot], str]], interval: int = POLL_INTERVAL, idle: int = POLL_IDLE):
+        self.renderers = renderers
+        self.interval = max(1, interval)
+        self.idle = max(self.interval, idle)
+        # Un texto con más de dos intervalos se considera viejo (p. ej. si HenrikDev falla).
+        self.max_age = 2 * self.interval
+        self._rendered: dict[str, tuple[str, float, float]] = {}
+        self._last_access = 0.0
+        self._paused = False
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def leer(self, name: str) -> Optional[str]:
+        item = self.leer_con_fecha(name)
+        return item[0] if item else None
+
+    def leer_con_fecha(self, name: str) -> Optional[tuple[str, float, float]]:
+        """(texto, epoch de los datos, segundos hasta el próximo refresco) o None."""
+        now = time.monotonic()
+        self._last_access = now
+        self._ensure_running()
+        item = self._rendered.get(name)
+        if item and now - item[1] <= self.max_age:
+            return item[0], item[2], max(0.0, self.interval - (now - item[1]))
+        return None
+
+    def refresh_once(self) -> None:
+        snap = refresh_snapshot()
+        now = time.monotonic()
+        for name, render in self.renderers.items():
+            try:
+                self._rendered[name] = (render(snap), now, snap.fetched_at)
+            except Exception:
+                # Sin texto pre-renderizado: el endpoint responderá por el camino normal.
+                logging.debug("No se pudo pre-renderizar %s", name, exc_info=True)
+                self._rendered.pop(name, None)
+
+    def _ensure_running(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            if self._paused:
+                self._wake.set()
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="valorant-poller", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            if time.monotonic() - self._last_access > self.idle:
+                # Se marca la pausa antes de volver a mirar `_last_access`: un lector que
+                # llegó en medio vio `_paused` en False y no despertó al hilo, pero su
+                # acceso sí se ve en este segundo chequeo.
+                self._paused = True
+                if time.monotonic() - self._last_access > self.idle:
+                    logging.info("Poller de Valorant en pausa (sin peticiones en %ss)", self.idle)
+                    self._wake.wait()
+                self._paused = False
+            self._wake.clear()
+            try:
+                self.refresh_once()
+            except Exception:
+                logging.exception("Error en el poller de Valorant")
+            self._wake.wait(self.interval)
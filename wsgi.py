@@ -0,0 +1,10 @@
+"""
+Punto de entrada WSGI para producción.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+`python app.py` sigue disponible para desarrollo local (servidor de Werkzeug).
+"""
+from app import app
+
+__all__ = ["app"]